@@ -0,0 +1,157 @@
+"""HTTP middleware shared by the application.
+
+Middleware here runs before route dependencies, so it must not rely on
+the authenticated user; `request_subject` reads the JWT `sub` claim
+without verifying it, which is only suitable for routing and accounting
+decisions, never for authorization.
+"""
+
+import asyncio
+import random
+import uuid
+from typing import Optional
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from jose import jwt
+from app.api.routes.auth import decode_token
+from app.core import profiling, rate_limit
+from app.core.config import settings
+from app.db import engine as db
+
+
+def request_subject(request: Request) -> Optional[str]:
+    """Return the unverified `sub` claim of the bearer token, if any."""
+    auth = request.headers.get("authorization", "")
+    scheme, _, token = auth.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.get_unverified_claims(token).get("sub")
+    except Exception:
+        return None
+
+
+async def request_id_middleware(request: Request, call_next):
+    """Tag the request with an id (the client's `X-Request-ID`, or a new one) for logs."""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = db.set_request_id(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        db.reset_request_id(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+async def read_your_writes_middleware(request: Request, call_next):
+    """Bind the request to its client so DB reads after a write hit the primary."""
+    client = request_subject(request) or (request.client.host if request.client else None)
+    token = db.set_client_key(client)
+    try:
+        return await call_next(request)
+    finally:
+        db.reset_client_key(token)
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware that admits or sheds requests via `AdmissionController`.
+
+    Implemented at the ASGI level (not `call_next`) so a request's in-flight
+    slot is held until its response body, including streams, is finished.
+    Rate limits are keyed on the verified JWT `sub`, falling back to the
+    client address for anonymous or invalid tokens.
+    """
+    def __init__(self, app, controller: Optional[rate_limit.AdmissionController] = None):
+        self.app = app
+        self.controller = controller
+
+    @staticmethod
+    def _subject(scope) -> str:
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and token:
+                    try:
+                        sub = decode_token(token).get("sub")
+                    except jwt.JWTError:
+                        sub = None
+                    if sub:
+                        return f"sub:{sub}"
+                break
+        client = scope.get("client")
+        return f"addr:{client[0] if client else 'unknown'}"
+
+    @staticmethod
+    def _route_class(scope) -> str:
+        if scope["path"].rstrip("/").endswith("/tickets/events"):
+            return rate_limit.STREAM
+        if scope["method"] in ("GET", "HEAD") or scope["path"].endswith("/batch-get"):
+            return rate_limit.READ
+        return rate_limit.WRITE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        controller = self.controller or rate_limit.get_admission_controller()
+        route_class = self._route_class(scope)
+        status, retry_after = controller.admit(self._subject(scope), route_class)
+        if status is not None:
+            detail = "Rate limit exceeded" if status == 429 else "Server busy, retry later"
+            response = JSONResponse({"detail": detail}, status_code=status, headers={"Retry-After": str(retry_after)})
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(route_class)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles triggered requests into the `ProfileStore`.
+
+    A request is profiled when it carries `PROFILE_HEADER` with a verified
+    admin token, or when it is drawn at `PROFILE_SAMPLE_RATE`. Streams are
+    never profiled, and a trigger that arrives while another profile is
+    running is ignored. The profile id is returned in the `X-Profile-Id`
+    response header.
+    """
+    def __init__(self, app, store: Optional[profiling.ProfileStore] = None):
+        self.app = app
+        self.store = store
+        self.header = settings.PROFILE_HEADER.lower().encode("latin-1")
+
+    def _trigger(self, scope) -> Optional[str]:
+        headers = dict(scope.get("headers", []))
+        if self.header in headers:
+            scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+            try:
+                if scheme.lower() == "bearer" and decode_token(token).get("role") == "admin":
+                    return "header"
+            except jwt.JWTError:
+                pass
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].rstrip("/").endswith("/tickets/events"):
+            return await self.app(scope, receive, send)
+        trigger = self._trigger(scope)
+        profile = profiling.RequestProfile() if trigger else None
+        if profile is None or not profile.start():
+            return await self.app(scope, receive, send)
+        store = self.store or profiling.get_profile_store()
+        meta = {"trigger": trigger, "method": scope["method"], "path": scope["path"], "status": None}
+        # Allocated up front: the id goes out in the headers, before the profile is complete
+        profile_id = store.new_id()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                meta["status"] = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.stop()
+            await asyncio.to_thread(store.save, profile, meta, profile_id)
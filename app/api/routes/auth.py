@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from functools import lru_cache
 from jose import jwt
-from pwdlib import PasswordHash
 from app.models.token import ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY, Token, UserLogin
 from datetime import datetime, timedelta, timezone
 
@@ -26,13 +26,17 @@ fake_user_login = {
     "password": "$argon2id$v=19$m=65536,t=3,p=4$DbYy/8v1GZezaRxfVu5nKw$7/PL82XGJa8FgLTIPU4ZFqOisZtjKfMOpHdIsHnnN+A"
 }
 
-password_hash = PasswordHash.recommended()
+@lru_cache(maxsize=None)
+def get_password_hasher():
+    """Build the Argon2 hasher on first use rather than at import (keeps boot fast)."""
+    from pwdlib import PasswordHash
+    return PasswordHash.recommended()
 
 def verify_password(password, hashed_password):
-    return password_hash.verify(password, hashed_password)
+    return get_password_hasher().verify(password, hashed_password)
 
 def get_password_hash(password):
-    return password_hash.hash(password)
+    return get_password_hasher().hash(password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None) -> Token:
     to_encode = data.copy()
@@ -40,13 +44,17 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> Token:
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return Token(access_token=encoded_jwt, token_type="bearer")
 
+def decode_token(token: str) -> dict:
+    """Verify `token` and return its claims; raises `jwt.JWTError` if invalid."""
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
 def decode_access_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(credentials.credentials)
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
+    except jwt.JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
 def required_role(role: str):
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.params import Depends
+from app.api.routes.auth import required_role
+from app.models.job import JobCreate
+from app.services.job_service import JobQueueFull, JobService, get_job_service
+
+router = APIRouter(dependencies=[Depends(required_role("admin"))])
+
+@router.post("/", response_model=dict, status_code=202)
+async def create_job(job: JobCreate, job_service: JobService = Depends(get_job_service)):
+    try:
+        saved = job_service.submit_job(job.kind.value, job.params)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return {"id": saved["id"], "status": saved["status"]}
+
+@router.get("/{job_id}")
+async def get_job(job_id: int, job_service: JobService = Depends(get_job_service)):
+    job = job_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/{job_id}/cancel", response_model=dict)
+async def cancel_job(job_id: int, job_service: JobService = Depends(get_job_service)):
+    job = job_service.cancel_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"id": job["id"], "status": job["status"]}
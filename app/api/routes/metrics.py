@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.params import Depends
+from fastapi.responses import FileResponse
+from app.api.routes.auth import required_role
+from app.core.profiling import ProfileStore, get_profile_store
+from app.core.rate_limit import AdmissionController, get_admission_controller
+
+router = APIRouter(dependencies=[Depends(required_role("admin"))])
+
+@router.get("/admission")
+async def admission_metrics(controller: AdmissionController = Depends(get_admission_controller)):
+    """In-flight counts, configured limits and admitted/rate-limited/shed totals."""
+    return controller.snapshot()
+
+@router.get("/profiles")
+async def list_profiles(store: ProfileStore = Depends(get_profile_store)):
+    """Stored request profiles, newest first (request, wall and DB time; no call data)."""
+    return store.list()
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, store: ProfileStore = Depends(get_profile_store)):
+    """One profile with its hottest functions and their callers."""
+    profile = store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@router.get("/profiles/{profile_id}/download")
+async def download_profile(profile_id: str, store: ProfileStore = Depends(get_profile_store)):
+    """The raw `cProfile` dump, for `pstats` or snakeviz."""
+    path = store.raw_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
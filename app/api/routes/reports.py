@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Query
+from fastapi.params import Depends
+from app.api.routes.auth import required_role
+from app.core.config import settings
+from app.models.report import ReportGranularity
+from app.services.report_service import ReportService, get_report_service
+
+router = APIRouter(dependencies=[Depends(required_role("admin"))])
+
+@router.get("/activity")
+async def activity_report(granularity: ReportGranularity = ReportGranularity.DAY, days: int = Query(settings.REPORT_MAX_DAYS, ge=1, le=settings.REPORT_MAX_DAYS),
+                          report_service: ReportService = Depends(get_report_service)):
+    """Tickets created, tickets closed and comments posted per hour or day, from the hourly rollup."""
+    return report_service.activity(granularity, days)
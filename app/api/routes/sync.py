@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Query
+from fastapi.params import Depends
+from app.api.routes.auth import decode_access_token
+from app.services.sync_service import SyncService, get_sync_service
+
+router = APIRouter(dependencies=[Depends(decode_access_token)])
+
+@router.get("")
+async def sync_changes(since: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000), sync_service: SyncService = Depends(get_sync_service)):
+    """Return ticket/comment changes after sequence `since`, oldest first.
+
+    Clients pass the returned `next_since` back as `since` on their next
+    call and keep paging while `has_more` is true. Deleted records are
+    returned as tombstones (`op: "delete"`, `data: null`).
+    """
+    return sync_service.changes_since(since, limit)
@@ -1,25 +1,116 @@
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import json
+from typing import Optional, Set, Tuple
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
 from app.api.routes.auth import decode_access_token, required_role
-from app.models.ticket import TicketCreate
+from app.core.config import settings
+from app.models.ticket import TICKET_FIELDS, TicketBatchGet, TicketCreate, TicketSort
+from app.services.event_bus import EventBus, get_event_bus
 from app.services.ticket_service import get_ticket_service, TicketService
 
 router = APIRouter(dependencies=[Depends(decode_access_token)])
 
+INCLUDABLE = {"comments"}
+
+def parse_fields(fields: Optional[str] = None) -> Optional[Tuple[str, ...]]:
+    """Parse a comma separated `fields=` projection; None means all columns."""
+    if not fields:
+        return None
+    return check_fields(f.strip() for f in fields.split(","))
+
+def check_fields(fields) -> Optional[Tuple[str, ...]]:
+    """Validate requested field names against `TICKET_FIELDS`."""
+    requested = tuple(dict.fromkeys(f for f in fields if f))
+    unknown = [f for f in requested if f not in TICKET_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested or None
+
+def parse_include(include: Optional[str] = None) -> Set[str]:
+    """Parse a comma separated `include=` list of embedded relations."""
+    return check_include(i.strip() for i in (include or "").split(","))
+
+def check_include(include) -> Set[str]:
+    """Validate requested embeddings against `INCLUDABLE`."""
+    requested = {i for i in include if i}
+    unknown = requested - INCLUDABLE
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(sorted(unknown))}")
+    return requested
+
 @router.post("/", response_model=dict)
 async def create_ticket(ticket: TicketCreate, service: TicketService = Depends(get_ticket_service)):
     saved = service.create_ticket(ticket)
     return {"id": saved["id"], "status": "created"}
 
+@router.post("/batch-get")
+async def batch_get_tickets(request: TicketBatchGet, service: TicketService = Depends(get_ticket_service)):
+    """Resolve up to BATCH_GET_MAX tickets in one call; misses are listed in `missing`."""
+    fields = check_fields(request.fields or [])
+    include = check_include(request.include)
+    return service.get_tickets(request.ids, fields=fields, include_comments="comments" in include)
+
+@router.post("/claim-next")
+async def claim_next_ticket(user: dict = Depends(decode_access_token), service: TicketService = Depends(get_ticket_service)):
+    """Assign the highest-priority, oldest open ticket to the caller; 204 if none is open."""
+    ticket = service.claim_next_ticket(user["sub"])
+    if not ticket:
+        return Response(status_code=204)
+    return ticket
+
+def format_sse(event: dict) -> str:
+    """Render a bus event in the Server-Sent Events wire format."""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(jsonable_encoder(event['data']))}\n\n"
+
+@router.get("/events")
+async def ticket_events(request: Request, last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"), bus: EventBus = Depends(get_event_bus)):
+    """Stream ticket and comment changes as Server-Sent Events.
+
+    Clients that reconnect with `Last-Event-ID` resume from the in-memory
+    ring buffer; a `reset` event means they missed too much and should
+    refetch. Slow consumers are dropped and their stream ends.
+    """
+    subscriber = bus.subscribe(last_event_id)
+
+    async def stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), timeout=settings.EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield format_sse(event)
+        finally:
+            bus.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @router.get("/{ticket_id}")
-async def get_ticket(ticket_id: int, service: TicketService = Depends(get_ticket_service)):
-    ticket = service.get_ticket(ticket_id)
+async def get_ticket(ticket_id: int, fields: Optional[Tuple[str, ...]] = Depends(parse_fields), include: Set[str] = Depends(parse_include), service: TicketService = Depends(get_ticket_service)):
+    ticket = await service.get_ticket_coalesced(ticket_id, fields=fields, include_comments="comments" in include)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
     return ticket
 
+@router.get("/{ticket_id}/comments")
+async def list_ticket_comments(ticket_id: int, limit: Optional[int] = Query(None, ge=1), cursor: Optional[str] = None, service: TicketService = Depends(get_ticket_service)):
+    """Page through a ticket's comments, newest first; follow `next_cursor` for older ones."""
+    try:
+        page = service.list_ticket_comments(ticket_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return page
+
 @router.get("/")
-async def list_tickets(service: TicketService = Depends(get_ticket_service)):
-    return service.list_tickets()
+async def list_tickets(sort: Optional[TicketSort] = None, fields: Optional[Tuple[str, ...]] = Depends(parse_fields), include: Set[str] = Depends(parse_include), service: TicketService = Depends(get_ticket_service)):
+    return await service.list_tickets_coalesced(include_comments="comments" in include, sort=sort.value if sort else None, fields=fields)
 
 @router.put("/{ticket_id}/title", response_model=dict, dependencies=[Depends(required_role("admin"))])
 async def update_ticket_title(ticket_id: int, new_title: str, service: TicketService = Depends(get_ticket_service)):
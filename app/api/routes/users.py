@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from fastapi.params import Depends
 from app.api.routes.auth import decode_access_token, required_role
-from app.models.user import UserCreate
+from app.models.user import UserBatchGet, UserCreate
 from app.services.user_service import UserService, get_user_service
 
 router = APIRouter(dependencies=[Depends(decode_access_token)])
@@ -11,6 +11,11 @@ async def create_user(user: UserCreate, user_service: UserService = Depends(get_
     saved = user_service.create_user(user)
     return {"user_email": saved["email"], "status": "created"}
 
+@router.post("/batch-get")
+async def batch_get_users(request: UserBatchGet, user_service: UserService = Depends(get_user_service)):
+    """Resolve up to BATCH_GET_MAX users by email in one call; misses are listed in `missing`."""
+    return await user_service.get_users([email.lower() for email in request.emails])
+
 @router.get("/{user_email}")
 async def get_user(user_email: str, user_service: UserService = Depends(get_user_service)):
     user = await user_service.get_user(user_email.lower())
@@ -0,0 +1,72 @@
+"""Micro-batching of concurrent async calls.
+
+Callers `submit` items and await their own result. Items are gathered
+until `max_items` are pending or the oldest has waited `max_wait`
+seconds, then handed to `flush` in one call (run off the event loop), so
+a burst of N writes costs roughly N / `max_items` backend round trips
+while no caller waits much longer than `max_wait` plus one flush.
+
+`flush` returns one result per item, in order. A result that is an
+exception is raised to that item's caller only; if `flush` itself raises,
+every caller in the batch gets the error. Cancelling a caller does not
+withdraw its item once it has been submitted.
+"""
+
+import asyncio
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+
+class Batcher:
+    def __init__(self, flush: Callable[[List[Any]], List[Any]], max_items: int, max_wait: float):
+        self.flush = flush
+        self.max_items = max_items
+        self.max_wait = max_wait
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any) -> Any:
+        """Queue `item` for the next batch and return its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_items:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._start_flush)
+        return await future
+
+    async def drain(self) -> None:
+        """Flush pending items now and wait for all batches in flight, e.g. at shutdown."""
+        self._start_flush()
+        while self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._flushing.add(task)
+            task.add_done_callback(self._flushing.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await asyncio.to_thread(self.flush, [item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"batch flush returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # caller was cancelled
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -1,7 +1,55 @@
 import os
+import tempfile
 
 class Settings:
     APP_NAME: str = os.getenv("APP_NAME", "support-ticket-backend")
     DEBUG: bool = os.getenv("DEBUG", "true").lower() == "true"
+    # Change stream (GET /tickets/events)
+    EVENT_QUEUE_SIZE: int = int(os.getenv("EVENT_QUEUE_SIZE", "256"))
+    EVENT_BUFFER_SIZE: int = int(os.getenv("EVENT_BUFFER_SIZE", "1024"))
+    EVENT_KEEPALIVE_SECONDS: float = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+    # DB mode: how often the change log is polled for other workers' writes (0 disables)
+    EVENT_RELAY_POLL_MS: float = float(os.getenv("EVENT_RELAY_POLL_MS", "500"))
+    # Background jobs (POST /jobs/)
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_MAX_PENDING: int = int(os.getenv("JOB_MAX_PENDING", "32"))
+    # Unfinished jobs whose worker has not heartbeated for this long are failed
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+    # Archiving of closed tickets (archive_closed_tickets job)
+    ARCHIVE_AFTER_DAYS: float = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+    ARCHIVE_BATCH_SIZE: int = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+    # Admission control and per-subject rate limiting, per worker process (0 disables a limit)
+    ADMISSION_MAX_IN_FLIGHT: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "256"))
+    ADMISSION_MAX_IN_FLIGHT_READ: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT_READ", "192"))
+    ADMISSION_MAX_IN_FLIGHT_WRITE: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT_WRITE", "64"))
+    ADMISSION_MAX_IN_FLIGHT_STREAM: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT_STREAM", "512"))
+    RATE_LIMIT_PER_SECOND: float = float(os.getenv("RATE_LIMIT_PER_SECOND", "20"))
+    RATE_LIMIT_BURST: float = float(os.getenv("RATE_LIMIT_BURST", "40"))
+    # Maximum ids/emails accepted by the batch-get endpoints
+    BATCH_GET_MAX: int = int(os.getenv("BATCH_GET_MAX", "100"))
+    # Comment pagination (GET /tickets/{id}/comments) and ticket detail embedding
+    COMMENTS_PAGE_SIZE: int = int(os.getenv("COMMENTS_PAGE_SIZE", "50"))
+    COMMENTS_PAGE_MAX: int = int(os.getenv("COMMENTS_PAGE_MAX", "200"))
+    TICKET_EMBEDDED_COMMENTS: int = int(os.getenv("TICKET_EMBEDDED_COMMENTS", "20"))
+    # Group commit of new comments in DB mode (COMMENT_BATCH_SIZE <= 1 disables)
+    COMMENT_BATCH_SIZE: int = int(os.getenv("COMMENT_BATCH_SIZE", "0"))
+    COMMENT_BATCH_WAIT_MS: float = float(os.getenv("COMMENT_BATCH_WAIT_MS", "5"))
+    # Activity reports (GET /reports/activity): longest window served and rebuilt
+    REPORT_MAX_DAYS: int = int(os.getenv("REPORT_MAX_DAYS", "90"))
+    # On-demand request profiling (admin header or sampled; see app.core.profiling)
+    PROFILE_HEADER: str = os.getenv("PROFILE_HEADER", "X-Profile")
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "support-ticket-profiles"))
+    PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", "50"))
+    # Persistence of the in-memory stores when no database is configured (app.core.journal)
+    IN_MEMORY_DATA_DIR: str = os.getenv("IN_MEMORY_DATA_DIR", "")
+    IN_MEMORY_FSYNC_MS: float = float(os.getenv("IN_MEMORY_FSYNC_MS", "50"))
+    IN_MEMORY_SNAPSHOT_EVERY: int = int(os.getenv("IN_MEMORY_SNAPSHOT_EVERY", "100000"))
+    # In-process user cache (0 disables caching of that kind of entry)
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    USER_CACHE_TTL: float = float(os.getenv("USER_CACHE_TTL", "60"))
+    USER_CACHE_NEGATIVE_TTL: float = float(os.getenv("USER_CACHE_NEGATIVE_TTL", "5"))
+    # How often the user cache checks for writes by other processes (0: on every lookup)
+    USER_CACHE_VERSION_CHECK_MS: float = float(os.getenv("USER_CACHE_VERSION_CHECK_MS", "100"))
 
 settings = Settings()
@@ -0,0 +1,254 @@
+"""Optional persistence for the in-memory stores.
+
+Used when the app runs without a database (see `main.lifespan`) and
+`IN_MEMORY_DATA_DIR` is set. Stores `attach` their dicts by name and
+report every write with `put`/`delete`. Writes are appended to an
+in-process buffer and return immediately; a flusher thread writes the
+buffer to the current log segment and fsyncs it every
+`IN_MEMORY_FSYNC_MS`, so one fsync covers a whole group of writes and a
+crash loses at most that window.
+
+Every `IN_MEMORY_SNAPSHOT_EVERY` logged writes, the journal starts a new
+log segment and writes a snapshot of all attached stores in a background
+thread. The stores keep serving writes meanwhile. Once the snapshot is in
+place, the segments it covers are deleted. At startup `load` reads the
+snapshot through `mmap` and replays the newer segments.
+
+Files in the data directory:
+
+- `snapshot.jsonl`: a header line `{"gen": G}`, then one
+  `{"s": store, "k": key, "v": record}` line per record; it covers every
+  write logged before segment G;
+- `wal.<gen>.log`: one `{"s": store, "op": "put"|"del", "k": key, "v": record}`
+  line per write. A torn last line from a crash is ignored on replay.
+
+If writing or fsyncing the log fails (e.g. a full disk), the error is
+logged, the flusher stops and every later write raises `JournalError`
+instead of being acknowledged and lost.
+"""
+
+import json
+import logging
+import mmap
+import os
+import re
+import time
+from threading import Condition, Event, Lock, Thread
+from typing import Callable, Dict, List, Optional
+from app.core.config import settings
+
+_SEGMENT = re.compile(r"^wal\.(\d+)\.log$")
+SNAPSHOT = "snapshot.jsonl"
+logger = logging.getLogger("app.core.journal")
+
+
+class JournalError(RuntimeError):
+    """Raised by writes once the journal can no longer persist them."""
+
+
+class Journal:
+    def __init__(self, directory: str, fsync_interval: Optional[float] = None, snapshot_every: Optional[int] = None):
+        self.directory = directory
+        self.fsync_interval = settings.IN_MEMORY_FSYNC_MS / 1000 if fsync_interval is None else fsync_interval
+        self.snapshot_every = settings.IN_MEMORY_SNAPSHOT_EVERY if snapshot_every is None else snapshot_every
+        self._stores: Dict[str, dict] = {}
+        self._on_load: List[Callable[[], None]] = []
+        self._cond = Condition(Lock())
+        self._pending: List[str] = []
+        self._since_snapshot = 0
+        self._snapshot_waiters: List[Event] = []
+        self._closed = False
+        # The I/O error that stopped the flusher, if any
+        self.error: Optional[BaseException] = None
+        # Owned by the flusher thread once `load` has run
+        self._gen = 0
+        self._segment = None
+        self._snapshotting: Optional[Thread] = None
+        self._flusher: Optional[Thread] = None
+
+    def attach(self, name: str, mapping: dict, on_load: Optional[Callable[[], None]] = None) -> None:
+        """Persist `mapping` under `name`; `on_load` runs after `load` restores it."""
+        self._stores[name] = mapping
+        if on_load is not None:
+            self._on_load.append(on_load)
+
+    def put(self, name: str, key, value: Dict) -> None:
+        self._append({"s": name, "op": "put", "k": key, "v": value})
+
+    def delete(self, name: str, key) -> None:
+        self._append({"s": name, "op": "del", "k": key})
+
+    def _append(self, entry: Dict) -> None:
+        line = json.dumps(entry, default=str)
+        with self._cond:
+            if self.error is not None:
+                raise JournalError(f"journal in {self.directory} failed: {self.error}") from self.error
+            self._pending.append(line)
+            self._since_snapshot += 1
+
+    def load(self) -> int:
+        """Restore attached stores from disk and start logging; return the number of records loaded."""
+        os.makedirs(self.directory, exist_ok=True)
+        covered = self._load_snapshot()
+        gens = sorted(g for g in self._segment_gens() if g >= covered)
+        for gen in gens:
+            self._replay(self._segment_path(gen))
+        for callback in self._on_load:
+            callback()
+        self._gen = max(gens + [covered]) + 1
+        self._segment = open(self._segment_path(self._gen), "a")
+        self._flusher = Thread(target=self._flush_loop, name="journal-flush", daemon=True)
+        self._flusher.start()
+        return sum(len(m) for m in self._stores.values())
+
+    def snapshot(self) -> None:
+        """Write a snapshot now and wait for it, e.g. before a planned shutdown."""
+        done = Event()
+        with self._cond:
+            if self.error is not None:
+                raise JournalError(f"journal in {self.directory} failed: {self.error}") from self.error
+            self._snapshot_waiters.append(done)
+            self._cond.notify()
+        done.wait()
+        if self.error is not None:
+            raise JournalError(f"journal in {self.directory} failed: {self.error}") from self.error
+
+    def close(self) -> None:
+        """Flush and fsync pending writes, finish any snapshot and stop the flusher."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self._snapshotting is not None:
+            self._snapshotting.join()
+        if self._segment is not None:
+            try:
+                self._segment.close()
+            except OSError:
+                pass  # already reported by the flusher
+
+    def _flush_loop(self) -> None:
+        """Group-commit buffered writes; rotate segments and start snapshots when due."""
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.fsync_interval)
+                lines, self._pending = self._pending, []
+                closing = self._closed
+                due = self._snapshot_waiters or (self.snapshot_every and self._since_snapshot >= self.snapshot_every)
+                rotate = bool(due) and not closing and (self._snapshotting is None or not self._snapshotting.is_alive())
+                if rotate:
+                    waiters, self._snapshot_waiters = self._snapshot_waiters, []
+                    self._since_snapshot = 0
+                    # Captured with the buffer swap: everything logged up to here
+                    # goes to the old segment and is reflected in the copy. Writes
+                    # racing with the copy also land in the new segment, and
+                    # replaying them over the snapshot is harmless.
+                    items = {name: list(mapping.items()) for name, mapping in self._stores.items()}
+            try:
+                if lines:
+                    self._segment.write("\n".join(lines) + "\n")
+                    self._segment.flush()
+                    os.fsync(self._segment.fileno())
+                if rotate:
+                    self._segment.close()
+                    self._gen += 1
+                    self._segment = open(self._segment_path(self._gen), "a")
+                    self._snapshotting = Thread(target=self._write_snapshot, args=(self._gen, items, waiters),
+                                                name="journal-snapshot", daemon=True)
+                    self._snapshotting.start()
+            except Exception as e:
+                logger.exception("Journal write to %s failed; refusing further writes", self.directory)
+                with self._cond:
+                    self.error = e
+                    self._pending = []
+                    waiters = (waiters if rotate else []) + self._snapshot_waiters
+                    self._snapshot_waiters = []
+                for waiter in waiters:
+                    waiter.set()
+                return
+            if closing:
+                for waiter in self._snapshot_waiters:
+                    waiter.set()
+                return
+
+    def _write_snapshot(self, gen: int, items: Dict[str, list], waiters: List[Event]) -> None:
+        try:
+            tmp = os.path.join(self.directory, SNAPSHOT + ".tmp")
+            with open(tmp, "w") as f:
+                f.write(json.dumps({"gen": gen}) + "\n")
+                for name, pairs in items.items():
+                    for key, value in pairs:
+                        f.write(json.dumps({"s": name, "k": key, "v": _stable_copy(value)}, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, os.path.join(self.directory, SNAPSHOT))
+            _fsync_dir(self.directory)
+            for old in self._segment_gens():
+                if old < gen:
+                    os.remove(self._segment_path(old))
+        except Exception:
+            # The log segments are kept, so nothing is lost; the next snapshot retries
+            logger.exception("Journal snapshot in %s failed", self.directory)
+        finally:
+            for waiter in waiters:
+                waiter.set()
+
+    def _load_snapshot(self) -> int:
+        """Load `snapshot.jsonl` if present; return the first segment generation it does not cover."""
+        path = os.path.join(self.directory, SNAPSHOT)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return 0
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            gen = json.loads(mm.readline())["gen"]
+            for line in iter(mm.readline, b""):
+                entry = json.loads(line)
+                store = self._stores.get(entry["s"])
+                if store is not None:
+                    store[entry["k"]] = entry["v"]
+        return gen
+
+    def _replay(self, path: str) -> None:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn write at the tail
+                store = self._stores.get(entry["s"])
+                if store is None:
+                    continue
+                if entry["op"] == "del":
+                    store.pop(entry["k"], None)
+                else:
+                    store[entry["k"]] = entry["v"]
+
+    def _segment_gens(self) -> List[int]:
+        return [int(m.group(1)) for m in map(_SEGMENT.match, os.listdir(self.directory)) if m]
+
+    def _segment_path(self, gen: int) -> str:
+        return os.path.join(self.directory, f"wal.{gen}.log")
+
+
+def _stable_copy(value):
+    """Copy a record that another thread may be mutating (retry on a resize mid-copy)."""
+    for _ in range(10):
+        try:
+            return dict(value) if isinstance(value, dict) else value
+        except RuntimeError:
+            time.sleep(0)
+    return dict(value)
+
+
+def _fsync_dir(directory: str) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
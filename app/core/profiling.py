@@ -0,0 +1,185 @@
+"""On-demand request profiling.
+
+`ProfilingMiddleware` (in `app.api.middleware`) runs `cProfile` around a
+request when an admin asks for it with the `PROFILE_HEADER` header, or for
+a `PROFILE_SAMPLE_RATE` fraction of requests. Untriggered requests pay
+for one header lookup and, with sampling on, one random draw.
+
+`cProfile` profiles the event loop thread, not the request: coroutines of
+other requests that run on the loop while a profile is active show up in
+its call data too. On a busy server read the function list with that in
+mind; the wall and DB times are the profiled request's own.
+
+While a profile is active, SQLAlchemy cursor events are timed, so the
+profile splits wall time into DB and non-DB time. The listeners are
+attached only for the duration of a profile. `cProfile` sees the event
+loop thread only; DB time also counts queries run through
+`asyncio.to_thread`, which copies the request context.
+
+Profiles are kept in `ProfileStore`, a ring of at most `PROFILE_MAX_FILES`
+profiles in `PROFILE_DIR`. Each has a `.json` summary (request metadata
+plus the hottest functions with their callers) and a `.prof` file
+loadable with `pstats` or snakeviz.
+"""
+
+import cProfile
+import itertools
+import json
+import os
+import pstats
+import re
+import time
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+
+_PROFILE_ID = re.compile(r"^[0-9]{13}-[0-9a-f]{8}-[0-9a-f]{8}$")
+
+# [seconds, statements] accumulated for the request being profiled
+_db_timer: ContextVar[Optional[list]] = ContextVar("profile_db_timer", default=None)
+
+_sequence = itertools.count()
+
+# cProfile cannot run two profilers at once; concurrent triggers are skipped
+_profile_lock = Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _db_timer.get() is not None:
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _db_timer.get()
+    started = conn.info.get("profile_started")
+    if timer is not None and started:
+        timer[0] += time.perf_counter() - started.pop()
+        timer[1] += 1
+
+
+class RequestProfile:
+    """Profile one request; use `start()` then `stop()`."""
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.db = [0.0, 0]
+        self.wall = 0.0
+        self._started = 0.0
+        self._token = None
+
+    def start(self) -> bool:
+        """Begin profiling; returns False if another profile is already running."""
+        if not _profile_lock.acquire(blocking=False):
+            return False
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        self._token = _db_timer.set(self.db)
+        self._started = time.perf_counter()
+        self.profiler.enable()
+        return True
+
+    def stop(self) -> None:
+        self.profiler.disable()
+        self.wall = time.perf_counter() - self._started
+        _db_timer.reset(self._token)
+        event.remove(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", _after_cursor_execute)
+        _profile_lock.release()
+
+    def summary(self, top: int = 50) -> List[Dict]:
+        """The `top` functions by cumulative time, each with its callers (the call tree edges)."""
+        stats = pstats.Stats(self.profiler).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+        return [{
+            "function": pstats.func_std_string(func),
+            "calls": nc,
+            "own_ms": round(tt * 1000, 3),
+            "cumulative_ms": round(ct * 1000, 3),
+            "callers": sorted(pstats.func_std_string(caller) for caller in callers),
+        } for func, (cc, nc, tt, ct, callers) in rows]
+
+
+class ProfileStore:
+    """Bounded on-disk ring of request profiles."""
+    def __init__(self, directory: Optional[str] = None, max_files: Optional[int] = None):
+        self.directory = directory or settings.PROFILE_DIR
+        self.max_files = settings.PROFILE_MAX_FILES if max_files is None else max_files
+        self._lock = Lock()
+
+    @staticmethod
+    def new_id() -> str:
+        """A profile id; ids sort by creation time.
+
+        The pid keeps ids unique between workers sharing `PROFILE_DIR`.
+        """
+        return f"{int(time.time() * 1000):013d}-{os.getpid() % 2**32:08x}-{next(_sequence) % 2**32:08x}"
+
+    def save(self, profile: RequestProfile, meta: Dict, pid: Optional[str] = None) -> str:
+        """Write `profile` with request `meta`, evict the oldest beyond `max_files`, return its id."""
+        os.makedirs(self.directory, exist_ok=True)
+        pid = pid or self.new_id()
+        summary = {
+            "id": pid, **meta,
+            "wall_ms": round(profile.wall * 1000, 3),
+            "db_ms": round(profile.db[0] * 1000, 3),
+            "db_statements": profile.db[1],
+            "functions": profile.summary(),
+        }
+        profile.profiler.dump_stats(self._path(pid, ".prof"))
+        tmp = self._path(pid, ".json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(summary, f)
+        os.replace(tmp, self._path(pid, ".json"))
+        with self._lock:
+            for old in self._ids()[self.max_files:]:
+                for suffix in (".json", ".prof"):
+                    try:
+                        os.remove(self._path(old, suffix))
+                    except FileNotFoundError:
+                        pass
+        return pid
+
+    def list(self) -> List[Dict]:
+        """Summaries of stored profiles without their function lists, newest first."""
+        listed = []
+        for pid in self._ids():
+            summary = self.get(pid)
+            if summary:
+                summary.pop("functions", None)
+                listed.append(summary)
+        return listed
+
+    def get(self, pid: str) -> Optional[Dict]:
+        if not _PROFILE_ID.match(pid):
+            return None
+        try:
+            with open(self._path(pid, ".json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def raw_path(self, pid: str) -> Optional[str]:
+        """Path of the `.prof` file for `pid`, or None if unknown."""
+        if not _PROFILE_ID.match(pid):
+            return None
+        path = self._path(pid, ".prof")
+        return path if os.path.exists(path) else None
+
+    def _ids(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((n[:-5] for n in names if n.endswith(".json") and _PROFILE_ID.match(n[:-5])), reverse=True)
+
+    def _path(self, pid: str, suffix: str) -> str:
+        return os.path.join(self.directory, pid + suffix)
+
+
+_profile_store_singleton: Optional[ProfileStore] = None
+def get_profile_store() -> ProfileStore:
+    global _profile_store_singleton
+    if _profile_store_singleton is None:
+        _profile_store_singleton = ProfileStore()
+    return _profile_store_singleton
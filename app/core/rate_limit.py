@@ -0,0 +1,141 @@
+"""Admission control and per-subject rate limiting.
+
+`AdmissionController` decides, before a request reaches any route,
+whether to run it now or shed it:
+
+- a token bucket per subject (JWT `sub`, or client address for anonymous
+  callers) caps each caller's request rate; excess requests get 429;
+- in-flight limits, global and per route class, cap concurrent work so a
+  burst cannot exhaust the DB pool; excess requests get 503.
+
+Rejections are immediate (no queuing) and carry a `Retry-After` hint, so
+overload degrades into fast failures instead of a latency collapse.
+Counters are kept for the `/metrics/admission` endpoint.
+"""
+
+import math
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+
+# Route classes with their own in-flight limits
+READ = "read"
+WRITE = "write"
+STREAM = "stream"
+
+
+class TokenBuckets:
+    """Token buckets keyed by subject, bounded to `max_subjects` (LRU)."""
+    def __init__(self, rate: float, burst: float, max_subjects: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_subjects = max_subjects
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = Lock()
+
+    def take(self, subject: str) -> float:
+        """Consume a token for `subject`; return 0 if allowed, else seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(subject, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[subject] = (tokens, now)
+            if len(self._buckets) > self.max_subjects:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def refund(self, subject: str) -> None:
+        """Give back the token taken for a request that was not run after all."""
+        with self._lock:
+            entry = self._buckets.get(subject)
+            if entry is not None:
+                self._buckets[subject] = (min(self.burst, entry[0] + 1), entry[1])
+
+
+class AdmissionController:
+    """Combine per-subject rate limits with global and per-class in-flight caps.
+
+    A limit of 0 disables that check.
+    """
+    def __init__(self, max_in_flight: Optional[int] = None, class_limits: Optional[Dict[str, int]] = None,
+                 rate: Optional[float] = None, burst: Optional[float] = None):
+        self.max_in_flight = settings.ADMISSION_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+        self.class_limits = class_limits if class_limits is not None else {
+            READ: settings.ADMISSION_MAX_IN_FLIGHT_READ,
+            WRITE: settings.ADMISSION_MAX_IN_FLIGHT_WRITE,
+            STREAM: settings.ADMISSION_MAX_IN_FLIGHT_STREAM,
+        }
+        rate = settings.RATE_LIMIT_PER_SECOND if rate is None else rate
+        burst = settings.RATE_LIMIT_BURST if burst is None else burst
+        self.buckets = TokenBuckets(rate, max(burst, 1)) if rate > 0 else None
+        self.in_flight = 0
+        self.class_in_flight: Dict[str, int] = {name: 0 for name in self.class_limits}
+        self.admitted = 0
+        self.rate_limited = 0
+        self.shed = 0
+        self._lock = Lock()
+
+    def admit(self, subject: str, route_class: str) -> Tuple[Optional[int], int]:
+        """Try to admit a request.
+
+        Returns `(None, 0)` when admitted (the caller must `release`), or
+        `(status_code, retry_after_seconds)` when the request is rejected.
+        """
+        if self.buckets is not None:
+            wait = self.buckets.take(subject)
+            if wait:
+                with self._lock:
+                    self.rate_limited += 1
+                return 429, max(1, math.ceil(wait))
+        with self._lock:
+            class_limit = self.class_limits.get(route_class, 0)
+            # Long-lived streams are bounded by their own class only
+            over_global = route_class != STREAM and self.max_in_flight and self.in_flight >= self.max_in_flight
+            over_class = class_limit and self.class_in_flight.get(route_class, 0) >= class_limit
+            if over_global or over_class:
+                self.shed += 1
+                # Shed requests never ran, so they do not count against the caller's rate
+                if self.buckets is not None:
+                    self.buckets.refund(subject)
+                return 503, 1
+            if route_class != STREAM:
+                self.in_flight += 1
+            self.class_in_flight[route_class] = self.class_in_flight.get(route_class, 0) + 1
+            self.admitted += 1
+        return None, 0
+
+    def release(self, route_class: str) -> None:
+        with self._lock:
+            if route_class != STREAM:
+                self.in_flight -= 1
+            self.class_in_flight[route_class] -= 1
+
+    def snapshot(self) -> Dict:
+        """Current counters and limits, for the metrics endpoint."""
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "class_in_flight": dict(self.class_in_flight),
+                "class_limits": dict(self.class_limits),
+                "rate_limit_per_second": self.buckets.rate if self.buckets else 0,
+                "rate_limit_burst": self.buckets.burst if self.buckets else 0,
+                "admitted": self.admitted,
+                "rate_limited": self.rate_limited,
+                "shed": self.shed,
+            }
+
+
+_admission_controller_singleton: Optional[AdmissionController] = None
+def get_admission_controller() -> AdmissionController:
+    global _admission_controller_singleton
+    if _admission_controller_singleton is None:
+        _admission_controller_singleton = AdmissionController()
+    return _admission_controller_singleton
@@ -0,0 +1,44 @@
+"""Single-flight coalescing of identical concurrent async calls.
+
+While a call for a key is in flight, later callers with the same key await
+the same task instead of starting their own, so backend load during a
+spike scales with the number of distinct keys, not with request count.
+Results and exceptions are delivered to every waiter. `forget_all` starts
+a new generation: calls already in flight finish for their waiters, but
+callers arriving afterwards (e.g. after a write) get a fresh call.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+        self.generation = 0
+        self.started = 0
+        self.shared = 0
+
+    def forget_all(self) -> None:
+        """Stop sharing calls that started before now. Safe to call from any thread."""
+        self.generation += 1
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """Return the result of `fn()`, sharing it with concurrent callers of `key`."""
+        full_key = (self.generation, key)
+        task = self._calls.get(full_key)
+        if task is None:
+            # A separate task so a cancelled caller does not cancel the shared call
+            task = asyncio.ensure_future(fn())
+            self._calls[full_key] = task
+            task.add_done_callback(lambda t: self._done(full_key, t))
+            self.started += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: Tuple[int, Hashable], task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
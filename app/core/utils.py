@@ -1,3 +1,12 @@
 def now_iso():
     from datetime import datetime
     return datetime.now().isoformat() + "Z"
+
+def hour_bucket(at):
+    """Truncate a datetime or ISO string to the start of its hour, as naive UTC."""
+    from datetime import datetime, timezone
+    if isinstance(at, str):
+        at = datetime.fromisoformat(at.replace("Z", "+00:00"))
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    return at.replace(minute=0, second=0, microsecond=0)
@@ -1,6 +1,18 @@
+import hashlib
+import json
+import logging
 import os
-from sqlalchemy import create_engine
+import re
+import sys
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, Optional
+from sqlalchemy import create_engine, event, func, inspect, literal, select
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+from sqlalchemy.schema import CreateIndex, CreateTable
 
 DB_USER = os.getenv('USER_NAME')
 DB_PASSWORD = os.getenv('PASSWORD')
@@ -10,6 +22,7 @@ DB_NAME = os.getenv('DB_NAME')
 DB_URL = os.getenv('DB_URL')
 
 engine = None
+read_engine = None
 SessionLocal = None
 
 # Prefer an explicit DATABASE_URL env var; otherwise attempt to build one from individual vars.
@@ -17,11 +30,332 @@ DATABASE_URL = os.getenv('DATABASE_URL')
 if not DATABASE_URL and all([DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME]):
     DATABASE_URL = f'{DB_URL}{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
 
+# Optional read replica; when set, repo reads go to it and writes to DATABASE_URL.
+DATABASE_READ_URL = os.getenv('DATABASE_READ_URL')
+# After a client writes, its reads stay on the primary for this many seconds
+# so it sees its own writes despite replication lag.
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+
+# Statements slower than this are logged as JSON to the "app.db.slow_query" logger; 0 disables.
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+# Explain slow SELECTs on Postgres with EXPLAIN ANALYZE, which runs them a second time.
+SLOW_QUERY_EXPLAIN_ANALYZE = os.getenv('SLOW_QUERY_EXPLAIN_ANALYZE', 'false').lower() == 'true'
+
+# SQLite: how long a writer waits for another process's write transaction before failing.
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
 # If still not set, fall back to a local SQLite DB so tests and dev environment work without Postgres.
 # if not DATABASE_URL:
 #     print("One or more database environment variables are not set; falling back to SQLite dev DB")
 #     DATABASE_URL = os.getenv('SQLITE_DATABASE_URL', 'sqlite:///./dev.db')
 
+# Identifies the client of the current request (set by middleware in app.main)
+_client_key: ContextVar[Optional[str]] = ContextVar("db_client_key", default=None)
+_recent_writes: Dict[str, float] = {}
+_recent_writes_lock = Lock()
+_RECENT_WRITES_MAX = 10000
+
+def set_client_key(key: Optional[str]):
+    """Bind the current context to a client for read-your-writes tracking."""
+    return _client_key.set(key)
+
+def reset_client_key(token) -> None:
+    _client_key.reset(token)
+
+def mark_write() -> None:
+    """Pin the current client's reads to the primary for READ_YOUR_WRITES_SECONDS."""
+    key = _client_key.get()
+    if key is None:
+        return
+    now = time.monotonic()
+    with _recent_writes_lock:
+        if len(_recent_writes) >= _RECENT_WRITES_MAX:
+            for k in [k for k, until in _recent_writes.items() if until <= now]:
+                del _recent_writes[k]
+        _recent_writes[key] = now + READ_YOUR_WRITES_SECONDS
+
+# Identifies the current request in slow-query logs (set by middleware in app.main)
+_request_id: ContextVar[Optional[str]] = ContextVar("db_request_id", default=None)
+
+def set_request_id(request_id: Optional[str]):
+    return _request_id.set(request_id)
+
+def reset_request_id(token) -> None:
+    _request_id.reset(token)
+
+def reads_pinned_to_primary() -> bool:
+    key = _client_key.get()
+    if key is None:
+        return False
+    with _recent_writes_lock:
+        until = _recent_writes.get(key)
+    return until is not None and until > time.monotonic()
+
+class RoutingSessionFactory:
+    """Session factory that sends writes to the primary and reads to a replica.
+
+    Calling the factory opens a primary session and counts as a write for
+    the current client; `read()` opens a replica session unless that client
+    wrote within the read-your-writes window. Repos use `read()` for their
+    `get`/`list` methods and the plain call for mutations.
+
+    Without `read_your_writes` (a replica that never lags, such as a
+    second engine on the same SQLite file) reads always go to the replica.
+    """
+    def __init__(self, primary: sessionmaker, replica: sessionmaker, read_your_writes: bool = True):
+        self.primary = primary
+        self.replica = replica
+        self.read_your_writes = read_your_writes
+
+    def __call__(self):
+        if self.read_your_writes:
+            mark_write()
+        return self.primary()
+
+    def read(self):
+        if self.read_your_writes and reads_pinned_to_primary():
+            return self.primary()
+        return self.replica()
+
+slow_query_logger = logging.getLogger("app.db.slow_query")
+# Fingerprints of slow statements already explained (bounded, oldest forgotten first)
+_explained: "OrderedDict[str, None]" = OrderedDict()
+_explained_lock = Lock()
+_EXPLAINED_MAX = 1000
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|(?<!:):\w+|\$\d+|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+def normalize_sql(statement: str) -> str:
+    """Collapse whitespace and replace literals and placeholders with `?` (IN lists with `(...)`)."""
+    sql = _LITERALS.sub("?", " ".join(statement.split()))
+    return _IN_LIST.sub("(...)", sql)
+
+def _parameters_shape(parameters, executemany: bool):
+    """Parameter names/positions with their type names, never the values."""
+    if executemany:
+        return {"rows": len(parameters), "row": _parameters_shape(parameters[0], False) if parameters else None}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+def _repo_method() -> Optional[str]:
+    """`Class.method` of the innermost `app.db.repositories` frame on the stack."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_globals.get("__name__") == "app.db.repositories":
+            owner = frame.f_locals.get("self")
+            name = frame.f_code.co_name
+            return f"{type(owner).__name__}.{name}" if owner is not None else name
+        frame = frame.f_back
+    return None
+
+# Statements whose plan is worth logging; DDL and transaction control are skipped
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+# Row-locking reads, which EXPLAIN ANALYZE would run (and lock) a second time
+_LOCKING_READ = re.compile(r"\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b", re.IGNORECASE)
+# Pools that hand the caller's own connection back (e.g. `sqlite://`), where
+# rolling back the EXPLAIN connection would discard the caller's transaction
+_SHARED_CONNECTION_POOLS = (SingletonThreadPool, StaticPool)
+
+def _explain(engine, statement: str, parameters, executemany: bool):
+    """Return the plan of `statement` as text lines.
+
+    Runs on a separate pooled connection whose transaction is rolled back,
+    so a failing EXPLAIN cannot abort the caller's transaction and nothing
+    it executes stays locked or applied. `EXPLAIN ANALYZE` is only used for
+    plain, non-locking SELECTs.
+    """
+    if engine.dialect.name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif (engine.dialect.name == "postgresql" and SLOW_QUERY_EXPLAIN_ANALYZE
+          and statement.lstrip().upper().startswith("SELECT") and not _LOCKING_READ.search(statement)):
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    else:
+        prefix = "EXPLAIN "
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [" | ".join(str(col) for col in row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    finally:
+        try:
+            raw.rollback()
+        finally:
+            raw.close()
+
+def install_query_logging(bind, threshold_ms: Optional[float] = None) -> None:
+    """Time every statement on `bind` and log those slower than `threshold_ms`.
+
+    Each slow statement is logged once per execution as one JSON object
+    with its normalized SQL, parameter shape, originating repo method and
+    request id. The first time a SELECT/INSERT/UPDATE/DELETE (by normalized
+    SQL) is slow, its plan is attached under `explain`, unless the engine's
+    pool has no second connection to run it on.
+    """
+    if threshold_ms is None:
+        if SLOW_QUERY_MS <= 0:
+            return
+        threshold_ms = SLOW_QUERY_MS
+    threshold = threshold_ms / 1000
+
+    @event.listens_for(bind, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(bind, "after_cursor_execute")
+    def _log_if_slow(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        if elapsed < threshold:
+            return
+        sql = normalize_sql(statement)
+        fingerprint = hashlib.sha1(sql.encode()).hexdigest()[:16]
+        entry = {
+            "event": "slow_query",
+            "duration_ms": round(elapsed * 1000, 3),
+            "threshold_ms": threshold_ms,
+            "sql": sql,
+            "fingerprint": fingerprint,
+            "params": _parameters_shape(parameters, executemany),
+            "repo_method": _repo_method(),
+            "request_id": _request_id.get(),
+        }
+        with _explained_lock:
+            first = fingerprint not in _explained
+            if first:
+                _explained[fingerprint] = None
+                if len(_explained) > _EXPLAINED_MAX:
+                    _explained.popitem(last=False)
+        if first and _EXPLAINABLE.match(statement) and not isinstance(conn.engine.pool, _SHARED_CONNECTION_POOLS):
+            try:
+                entry["explain"] = _explain(conn.engine, statement, parameters, executemany)
+            except Exception as e:
+                entry["explain_error"] = str(e)
+        slow_query_logger.warning(json.dumps(entry, default=str))
+
+def configure_sqlite(bind, immediate: bool) -> None:
+    """Make a SQLite file engine safe to share between processes (e.g. uvicorn workers).
+
+    Every connection uses WAL, so readers never block the writer or each
+    other, and waits up to SQLITE_BUSY_TIMEOUT_MS for a competing writer.
+    With `immediate`, transactions start with BEGIN IMMEDIATE and take the
+    write lock up front; a deferred transaction that reads and then writes
+    would fail with "database is locked" when another process wrote in
+    between, where an immediate one just queues for the lock.
+    """
+    @event.listens_for(bind, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        # Let the "begin" listener below issue BEGIN instead of the driver
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.close()
+
+    @event.listens_for(bind, "begin")
+    def _on_begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+def _is_sqlite_file(bind) -> bool:
+    return bind.dialect.name == "sqlite" and bind.url.database not in (None, "", ":memory:")
+
+def _sessionmaker(bind):
+    return sessionmaker(bind=bind, autoflush=False, autocommit=False, expire_on_commit=False)
+
+def schema_fingerprint(metadata, dialect) -> str:
+    """Hash the DDL `metadata` would emit for `dialect`."""
+    digest = hashlib.sha256()
+    for table in metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    return digest.hexdigest()
+
+class SchemaOutOfDate(RuntimeError):
+    """Existing tables lack columns the models define; the database needs a migration."""
+
+def _backfills(models) -> Dict:
+    """Statement that fills a column added to an existing table, by (table, column)."""
+    from app.models.ticket import Status
+    tickets, comments = models.Ticket.__table__, models.Comment.__table__
+    per_ticket = comments.c.ticket_id == tickets.c.id
+    return {
+        ("tickets", "comment_count"): tickets.update().values(
+            comment_count=select(func.count()).where(per_ticket).scalar_subquery()),
+        ("tickets", "last_activity_at"): tickets.update().values(last_activity_at=func.coalesce(
+            select(func.max(comments.c.created_at)).where(per_ticket).scalar_subquery(), tickets.c.created_at)),
+        # Closed before closed_at existed: start the archive window now
+        ("tickets", "closed_at"): tickets.update().where(tickets.c.status == Status.CLOSED).values(closed_at=func.now()),
+    }
+
+def _add_missing_columns(conn, models) -> list:
+    """Add model columns missing from existing tables and backfill them.
+
+    A column can be added in place if it is nullable or has a scalar
+    default; returns the "table.column" names that cannot.
+    """
+    inspector = inspect(conn)
+    backfills = _backfills(models)
+    unfixable = []
+    for table in models.Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            default = column.default.arg if column.default is not None and column.default.is_scalar else None
+            if not column.nullable and default is None:
+                unfixable.append(f"{table.name}.{column.name}")
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+            if default is not None:
+                ddl += " DEFAULT " + str(literal(default).compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+            if not column.nullable:
+                ddl += " NOT NULL"
+            conn.exec_driver_sql(ddl)
+            if (table.name, column.name) in backfills:
+                conn.execute(backfills[table.name, column.name])
+    return unfixable
+
+def ensure_schema(bind) -> bool:
+    """Create missing tables unless the stored schema fingerprint is current.
+
+    `create_all` inspects every table on each call, which dominates boot
+    time on a warm database; one indexed lookup is enough to skip it.
+    Returns True if DDL was run. Columns added to existing tables since
+    they were created are added and backfilled in place, and missing
+    indexes are created. If a missing column cannot be added (NOT NULL
+    without a default), `SchemaOutOfDate` is raised and the fingerprint
+    is not stored, so a stale schema is never recorded as current.
+    """
+    from app.db import models
+    fingerprint = schema_fingerprint(models.Base.metadata, bind.dialect)
+    try:
+        with bind.connect() as conn:
+            current = conn.execute(select(models.SchemaVersion.fingerprint).where(models.SchemaVersion.id == 1)).scalar()
+    except Exception:
+        current = None
+    if current == fingerprint:
+        return False
+    models.Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        missing = _add_missing_columns(conn, models)
+    if missing:
+        raise SchemaOutOfDate(f"Database schema is out of date, migrate it first; missing columns: {', '.join(missing)}")
+    with bind.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+        table = models.SchemaVersion.__table__
+        conn.execute(table.delete())
+        conn.execute(table.insert().values(id=1, fingerprint=fingerprint))
+    return True
+
 def init_db():
     print("Setting up database...")
 
@@ -29,15 +363,31 @@ def init_db():
         print("Database URL not set; skipping database initialization.")
         raise ValueError("Database URL not set")
 
-    global engine, SessionLocal
+    global engine, read_engine, SessionLocal
     engine = create_engine(DATABASE_URL, future=True)
-    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
-    
-    from app.db import models
-    models.Base.metadata.create_all(bind=engine)
+    install_query_logging(engine)
+    SessionLocal = _sessionmaker(engine)
+    sqlite_file = _is_sqlite_file(engine)
+    if sqlite_file:
+        # Writes queue on an immediate-transaction engine
+        configure_sqlite(engine, immediate=True)
+    if DATABASE_READ_URL or sqlite_file:
+        # Reads go to the replica, or without one to a second engine on the
+        # same SQLite file so they never wait for the write lock
+        read_engine = create_engine(DATABASE_READ_URL or DATABASE_URL, future=True)
+        if _is_sqlite_file(read_engine):
+            configure_sqlite(read_engine, immediate=False)
+        install_query_logging(read_engine)
+        SessionLocal = RoutingSessionFactory(SessionLocal, _sessionmaker(read_engine), read_your_writes=bool(DATABASE_READ_URL))
+
+    if not ensure_schema(engine):
+        print("Database schema is current; skipping create_all.")
 
 def close_db():
-    global engine
+    global engine, read_engine
+    if read_engine:
+        read_engine.dispose()
+        read_engine = None
     if engine:
         engine.dispose()
         engine = None
@@ -1,31 +1,146 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Enum as SAEnum
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index, Enum as SAEnum, func
 from sqlalchemy.orm import declarative_base
 from datetime import datetime, timezone
 from app.models.ticket import Priority, Status
 from app.models.user import Role
+from app.models.job import JobStatus
 
 Base = declarative_base()
 
 class Ticket(Base):
     __tablename__ = "tickets"
+    # AUTOINCREMENT: ids of archived tickets must never be reused by SQLite
+    __table_args__ = (
+        Index("ix_tickets_status_closed_at", "status", "closed_at"),
+        # claim-next: oldest open ticket per priority, one index probe each
+        Index("ix_tickets_status_priority_created", "status", "priority", "created_at", "id"),
+        {"sqlite_autoincrement": True},
+    )
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     description = Column(Text)
     priority = Column(SAEnum(Priority), default=Priority.LOW)
     status = Column(SAEnum(Status), default=Status.OPEN)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Denormalized from comments so list views never need to load them
+    comment_count = Column(Integer, nullable=False, default=0)
+    last_activity_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    # Set when the ticket is closed, cleared when reopened; drives archiving
+    closed_at = Column(DateTime)
+    # Agent that claimed the ticket through claim-next
+    assignee = Column(String)
 
 class Comment(Base):
     __tablename__ = "comments"
+    # Keyset pagination of a ticket's comments on (created_at, id); also
+    # serves plain ticket_id lookups as its leftmost prefix
+    __table_args__ = (
+        Index("ix_comments_ticket_created_id", "ticket_id", "created_at", "id"),
+        {"sqlite_autoincrement": True},
+    )
     id = Column(Integer, primary_key=True, index=True)
-    ticket_id = Column(Integer, nullable=False, index=True)
+    ticket_id = Column(Integer, nullable=False)
     user_email = Column(String, nullable=False)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
+class ArchivedTicket(Base):
+    """Closed tickets moved out of `tickets` by `TicketRepo.archive_closed`."""
+    __tablename__ = "tickets_archive"
+    id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    description = Column(Text)
+    priority = Column(SAEnum(Priority))
+    status = Column(SAEnum(Status))
+    created_at = Column(DateTime)
+    comment_count = Column(Integer, nullable=False, default=0)
+    last_activity_at = Column(DateTime)
+    closed_at = Column(DateTime)
+    assignee = Column(String)
+    archived_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class ArchivedComment(Base):
+    """Comments moved to the archive together with their ticket."""
+    __tablename__ = "comments_archive"
+    id = Column(Integer, primary_key=True)
+    ticket_id = Column(Integer, nullable=False, index=True)
+    user_email = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, nullable=False, unique=True, index=True)
     role = Column(SAEnum(Role), nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+# Case-normalized lookups (`lower(email) = :email`) stay index-backed
+Index("ix_users_email_lower", func.lower(User.email))
+
+class ActivityRollup(Base):
+    """Hourly counts of ticket/comment activity, bumped in the writing transaction.
+
+    Reports read only these rows, so their cost follows the number of
+    hours covered rather than the size of the ticket and comment tables.
+    """
+    __tablename__ = "activity_rollup"
+    bucket_start = Column(DateTime, primary_key=True)
+    metric = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class ChangeLog(Base):
+    """Latest change per ticket/comment, ordered by a monotonic sequence.
+
+    Older entries for the same entity are pruned on every write, so the
+    table holds one row per live entity plus one tombstone per deleted one.
+    AUTOINCREMENT keeps SQLite from reusing the sequence numbers of pruned rows.
+    """
+    __tablename__ = "change_log"
+    __table_args__ = (
+        Index("ix_change_log_entity", "entity", "entity_id"),
+        {"sqlite_autoincrement": True},
+    )
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)
+    changed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    status = Column(SAEnum(JobStatus), nullable=False, default=JobStatus.PENDING, index=True)
+    params = Column(Text)  # JSON
+    progress = Column(Integer, nullable=False, default=0)
+    total = Column(Integer)
+    result = Column(Text)  # JSON
+    error = Column(Text)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Worker process that runs the job, and when it last reported being alive;
+    # unfinished jobs whose heartbeat lapses are failed by the other workers
+    owner = Column(String)
+    heartbeat_at = Column(DateTime)
+
+class CacheVersion(Base):
+    """Version counter per cached entity, bumped in every writing transaction.
+
+    Processes sharing the database compare it with the version they last
+    saw to drop in-process cache entries that another process invalidated.
+    """
+    __tablename__ = "cache_versions"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class SchemaVersion(Base):
+    """Fingerprint of the metadata the database was last created from.
+
+    `init_db` skips `create_all` when the stored fingerprint matches.
+    """
+    __tablename__ = "schema_version"
+    id = Column(Integer, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -1,6 +1,176 @@
 import app.db.engine as db
-from typing import Callable, Optional, Dict, List
-from app.db.models import Ticket, Comment
+import json
+from datetime import datetime, timezone
+from typing import Callable, Optional, Dict, List, Sequence
+from collections import Counter, OrderedDict
+from threading import Lock
+from sqlalchemy import event, func, insert, literal, or_, select, text, tuple_
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.core.utils import hour_bucket
+from app.db.models import ActivityRollup, CacheVersion, Ticket, Comment, ChangeLog, Job, ArchivedTicket, ArchivedComment
+from app.models.job import JobStatus
+from app.models.ticket import CLAIM_PRIORITY_ORDER, Status
+
+def _read_session(session_factory):
+    """Open a session for a read-only query, on the replica when one is configured."""
+    read = getattr(session_factory, "read", None)
+    return read() if read else session_factory()
+
+def _as_datetime(value) -> Optional[datetime]:
+    """Coerce the ISO strings produced by `now_iso` into datetimes for DB columns."""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+def _ticket_to_dict(t: Ticket) -> Dict:
+    return {"id": t.id, "title": t.title, "description": t.description, "priority": t.priority, "status": t.status, "created_at": t.created_at,
+            "comment_count": t.comment_count, "last_activity_at": t.last_activity_at, "closed_at": t.closed_at, "assignee": t.assignee}
+
+def _ticket_columns(fields: Optional[Sequence[str]], model=Ticket):
+    """Map requested field names to `model` columns, always including the primary key."""
+    names = ["id"] + [f for f in fields if f != "id"]
+    return [getattr(model, name) for name in names]
+
+def _copy_to_archive(session, source, target, where, archived_at: datetime) -> None:
+    """INSERT ... SELECT the rows of `source` matching `where` into `target`."""
+    names = [c.name for c in source.__table__.columns]
+    query = select(*[getattr(source, n) for n in names], literal(archived_at, type_=target.archived_at.type)).where(where)
+    session.execute(insert(target).from_select(names + ["archived_at"], query))
+
+def _unarchive(session, ticket_id: int) -> bool:
+    """Move an archived ticket and its comments back to the hot tables.
+
+    Writes go through the hot tables only, so a write to an archived ticket
+    first brings it back; a closed one is archived again by the next run.
+    Returns False if the ticket is not archived.
+    """
+    if session.query(ArchivedTicket.id).filter(ArchivedTicket.id == ticket_id).first() is None:
+        return False
+    for source, target, where in ((ArchivedTicket, Ticket, ArchivedTicket.id == ticket_id),
+                                  (ArchivedComment, Comment, ArchivedComment.ticket_id == ticket_id)):
+        names = [c.name for c in target.__table__.columns]
+        session.execute(insert(target).from_select(names, select(*[getattr(source, n) for n in names]).where(where)))
+    session.query(ArchivedComment).filter(ArchivedComment.ticket_id == ticket_id).delete(synchronize_session=False)
+    session.query(ArchivedTicket).filter(ArchivedTicket.id == ticket_id).delete(synchronize_session=False)
+    return True
+
+def _ticket_for_write(session, ticket_id: int) -> Optional[Ticket]:
+    """Load a hot ticket to modify, unarchiving it if needed."""
+    t = session.query(Ticket).get(ticket_id)
+    if t is None and _unarchive(session, ticket_id):
+        t = session.query(Ticket).get(ticket_id)
+    return t
+
+def _comment_for_write(session, comment_id: int) -> Optional[Comment]:
+    """Load a hot comment to modify, unarchiving its ticket if needed."""
+    c = session.query(Comment).get(comment_id)
+    if c is None:
+        archived = session.query(ArchivedComment.ticket_id).filter(ArchivedComment.id == comment_id).first()
+        if archived is not None and _unarchive(session, archived.ticket_id):
+            c = session.query(Comment).get(comment_id)
+    return c
+
+def _bump_ticket_comments(session, ticket_id: int, delta: int, at: Optional[datetime] = None) -> None:
+    """Adjust a ticket's comment counters (unarchiving it if needed) and record the change."""
+    values = {Ticket.comment_count: Ticket.comment_count + delta}
+    if at is not None:
+        values[Ticket.last_activity_at] = at
+    where = [Ticket.id == ticket_id] + ([Ticket.comment_count > 0] if delta < 0 else [])
+    updated = session.query(Ticket).filter(*where).update(values, synchronize_session=False)
+    if not updated and _unarchive(session, ticket_id):
+        updated = session.query(Ticket).filter(*where).update(values, synchronize_session=False)
+    if updated:
+        _record_change(session, "ticket", ticket_id)
+
+def _comment_to_dict(c: Comment) -> Dict:
+    return {"id": c.id, "ticket_id": c.ticket_id, "user_email": c.user_email, "content": c.content, "created_at": c.created_at}
+
+# Key of the Postgres advisory lock that serializes change-log writers
+_CHANGE_LOG_LOCK_KEY = 0x43484C47
+
+# Recent change-log seqs written by this process, so the change relay can
+# tell them from other workers' writes (bounded, oldest forgotten first)
+_written_here: "OrderedDict[int, None]" = OrderedDict()
+_written_here_lock = Lock()
+_WRITTEN_HERE_MAX = 100000
+
+def changes_written_here(seq: int) -> bool:
+    """Whether change-log entry `seq` was written by this process."""
+    with _written_here_lock:
+        return seq in _written_here
+
+def _record_change(session, entity: str, entity_id: int, op: str = "upsert") -> None:
+    """Queue a change-log entry for the caller's transaction; written by `_write_changes` at commit.
+
+    `op` is "upsert" or "delete"; delete entries are the tombstones served by
+    `ChangeRepo.changes_since`. Repeated changes to one entity in a
+    transaction collapse into its last one.
+    """
+    session.info.setdefault("pending_changes", {})[(entity, entity_id)] = op
+
+@event.listens_for(Session, "before_commit")
+def _write_changes(session) -> None:
+    """Insert the queued change-log entries and prune the older ones for the same entities.
+
+    `seq` is assigned at INSERT, so a client that has read seq N must never
+    see a smaller seq commit later. The entries are therefore written only
+    at commit, after the transaction's other writes, under a transaction-
+    scoped lock. Writers serialize for just the INSERT and the commit, and
+    seq order is commit order. SQLite already admits one writer at a time.
+    """
+    pending = session.info.pop("pending_changes", None)
+    if not pending:
+        return
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _CHANGE_LOG_LOCK_KEY})
+    entries = [ChangeLog(entity=entity, entity_id=entity_id, op=op) for (entity, entity_id), op in pending.items()]
+    session.add_all(entries)
+    session.flush()
+    with _written_here_lock:
+        for e in entries:
+            _written_here[e.seq] = None
+        while len(_written_here) > _WRITTEN_HERE_MAX:
+            _written_here.popitem(last=False)
+    first_seq = min(e.seq for e in entries)
+    for entity in {e.entity for e in entries}:
+        session.query(ChangeLog).filter(
+            ChangeLog.entity == entity,
+            ChangeLog.entity_id.in_([e.entity_id for e in entries if e.entity == entity]),
+            ChangeLog.seq < first_seq,
+        ).delete(synchronize_session=False)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session) -> None:
+    session.info.pop("pending_changes", None)
+
+def _bump_activity(session, metric: str, at, amount: int = 1) -> None:
+    """Add `amount` to the hourly rollup row of `metric` in the caller's transaction."""
+    bucket = hour_bucket(at or datetime.now(timezone.utc))
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        upsert = (pg_insert if dialect == "postgresql" else sqlite_insert)(ActivityRollup).values(bucket_start=bucket, metric=metric, count=amount)
+        session.execute(upsert.on_conflict_do_update(
+            index_elements=["bucket_start", "metric"], set_={"count": ActivityRollup.count + amount},
+        ))
+        return
+    if not session.query(ActivityRollup).filter(ActivityRollup.bucket_start == bucket, ActivityRollup.metric == metric).update(
+        {ActivityRollup.count: ActivityRollup.count + amount}, synchronize_session=False,
+    ):
+        session.add(ActivityRollup(bucket_start=bucket, metric=metric, count=amount))
+
+def _bump_cache_version(session, name: str) -> None:
+    """Invalidate other processes' cached `name` entries once the caller's transaction commits."""
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        upsert = (pg_insert if dialect == "postgresql" else sqlite_insert)(CacheVersion).values(name=name, version=1)
+        session.execute(upsert.on_conflict_do_update(index_elements=["name"], set_={"version": CacheVersion.version + 1}))
+        return
+    if not session.query(CacheVersion).filter(CacheVersion.name == name).update(
+        {CacheVersion.version: CacheVersion.version + 1}, synchronize_session=False,
+    ):
+        session.add(CacheVersion(name=name, version=1))
 
 class TicketRepo:
     def __init__(self, session_factory: Callable):
@@ -9,55 +179,135 @@ class TicketRepo:
     def save(self, data: Dict) -> Dict:
         session = self.session_factory()
         try:
+            data = dict(data, created_at=_as_datetime(data.get("created_at")) or datetime.now(timezone.utc))
+            data.setdefault("last_activity_at", data["created_at"])
+            if data.get("status") == Status.CLOSED:
+                data.setdefault("closed_at", data["created_at"])
             t = Ticket(**data)
             session.add(t)
+            session.flush()
+            _record_change(session, "ticket", t.id)
+            _bump_activity(session, "created", t.created_at)
+            if t.closed_at is not None:
+                _bump_activity(session, "closed", t.closed_at)
             session.commit()
             session.refresh(t)
-            return {"id": t.id, "title": t.title, "description": t.description, "priority": t.priority, "status": t.status, "created_at": t.created_at}
+            return _ticket_to_dict(t)
         except Exception as e:
             session.rollback()
             raise e
         finally:
             session.close()
 
-    def get(self, tid: int) -> Optional[Dict]:
-        session = self.session_factory()
+    def get(self, tid: int, fields: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        """Return a ticket by id, falling through to the archive if it is not hot.
+
+        When `fields` is given only those columns are selected.
+        """
+        session = _read_session(self.session_factory)
         try:
-            t = session.query(Ticket).get(tid)
-            if not t:
-                return None
-            return {"id": t.id, "title": t.title, "description": t.description, "priority": t.priority, "status": t.status, "created_at": t.created_at}
+            for model in (Ticket, ArchivedTicket):
+                if fields:
+                    row = session.query(*_ticket_columns(fields, model)).filter(model.id == tid).first()
+                    if row:
+                        return dict(row._mapping)
+                    continue
+                t = session.query(model).get(tid)
+                if t:
+                    return _ticket_to_dict(t)
+            return None
         except Exception as e:
             raise e
         finally:
             session.close()
     
+    def get_many(self, ids: Sequence[int], fields: Optional[Sequence[str]] = None) -> Dict[int, Dict]:
+        """Return the tickets for `ids` keyed by id with one `IN` query (plus one on the archive for misses)."""
+        session = _read_session(self.session_factory)
+        try:
+            found: Dict[int, Dict] = {}
+            for model in (Ticket, ArchivedTicket):
+                missing = set(ids) - found.keys()
+                if not missing:
+                    break
+                if fields:
+                    rows = session.query(*_ticket_columns(fields, model)).filter(model.id.in_(missing))
+                    found.update({r.id: dict(r._mapping) for r in rows})
+                else:
+                    found.update({t.id: _ticket_to_dict(t) for t in session.query(model).filter(model.id.in_(missing))})
+            return found
+        finally:
+            session.close()
+
     def update_status(self, ticket_id: int, new_status: str) -> Optional[Dict]:
         session = self.session_factory()
         try:
-            t = session.query(Ticket).get(ticket_id)
+            t = _ticket_for_write(session, ticket_id)
             if not t:
                 return None
+            was_closed = t.status == Status.CLOSED
             t.status = new_status
+            t.closed_at = (t.closed_at or datetime.now(timezone.utc)) if new_status == Status.CLOSED else None
+            _record_change(session, "ticket", t.id)
+            if new_status == Status.CLOSED and not was_closed:
+                _bump_activity(session, "closed", t.closed_at)
             session.commit()
             session.refresh(t)
-            return {"id": t.id, "title": t.title, "description": t.description, "priority": t.priority, "status": t.status, "created_at": t.created_at}
+            return _ticket_to_dict(t)
         except Exception as e:
             session.rollback()
             raise e
         finally:
             session.close()
             
+    def claim_next(self, assignee: str) -> Optional[Dict]:
+        """Atomically take the highest-priority, oldest open ticket for `assignee`.
+
+        Each priority is one probe of `ix_tickets_status_priority_created`
+        with `FOR UPDATE SKIP LOCKED`, so on Postgres concurrent claimers
+        skip each other's candidate rows instead of queuing on them. The
+        update is also conditioned on the ticket still being open, which
+        keeps backends without row locks (SQLite) from double-claiming.
+        Returns the claimed ticket, or None if nothing is open.
+        """
+        session = self.session_factory()
+        try:
+            for priority in CLAIM_PRIORITY_ORDER:
+                while True:
+                    row = (session.query(Ticket.id)
+                           .filter(Ticket.status == Status.OPEN, Ticket.priority == priority)
+                           .order_by(Ticket.created_at, Ticket.id)
+                           .limit(1)
+                           .with_for_update(skip_locked=True)
+                           .first())
+                    if row is None:
+                        break
+                    claimed = session.query(Ticket).filter(Ticket.id == row.id, Ticket.status == Status.OPEN).update(
+                        {Ticket.status: Status.IN_PROGRESS, Ticket.assignee: assignee}, synchronize_session=False,
+                    )
+                    if claimed:
+                        _record_change(session, "ticket", row.id)
+                        session.commit()
+                        return _ticket_to_dict(session.query(Ticket).get(row.id))
+            session.commit()
+            return None
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
     def update_priority(self, ticket_id: int, new_priority: str) -> Optional[Dict]:
         session = self.session_factory()
         try:
-            t = session.query(Ticket).get(ticket_id)
+            t = _ticket_for_write(session, ticket_id)
             if not t:
                 return None
             t.priority = new_priority
+            _record_change(session, "ticket", t.id)
             session.commit()
             session.refresh(t)
-            return {"id": t.id, "title": t.title, "description": t.description, "priority": t.priority, "status": t.status, "created_at": t.created_at}
+            return _ticket_to_dict(t)
         except Exception as e:
             session.rollback()
             raise e
@@ -68,16 +318,17 @@ class TicketRepo:
         """Update title and/or description for a ticket and return updated dict."""
         session = self.session_factory()
         try:
-            t = session.query(Ticket).get(ticket_id)
+            t = _ticket_for_write(session, ticket_id)
             if not t:
                 return None
             if new_title is not None:
                 t.title = new_title
             if new_description is not None:
                 t.description = new_description
+            _record_change(session, "ticket", t.id)
             session.commit()
             session.refresh(t)
-            return {"id": t.id, "title": t.title, "description": t.description, "priority": t.priority, "status": t.status, "created_at": t.created_at}
+            return _ticket_to_dict(t)
         except Exception as e:
             session.rollback()
             raise e
@@ -88,11 +339,12 @@ class TicketRepo:
         """Delete a ticket and return the deleted record dict, or None if missing."""
         session = self.session_factory()
         try:
-            t = session.query(Ticket).get(ticket_id)
+            t = _ticket_for_write(session, ticket_id)
             if not t:
                 return None
-            result = {"id": t.id, "title": t.title, "description": t.description, "priority": t.priority, "status": t.status, "created_at": t.created_at}
+            result = _ticket_to_dict(t)
             session.delete(t)
+            _record_change(session, "ticket", ticket_id, "delete")
             session.commit()
             return result
         except Exception as e:
@@ -101,11 +353,70 @@ class TicketRepo:
         finally:
             session.close()
 
-    def list(self) -> List[Dict]:
+    def set_comment_stats(self, ticket_id: int, comment_count: int, last_activity_at=None) -> Optional[Dict]:
+        """Overwrite the denormalized comment counters, e.g. after a recount."""
         session = self.session_factory()
         try:
-            rows = session.query(Ticket).all()
-            return [{"id": r.id, "title": r.title, "description": r.description, "priority": r.priority, "status": r.status, "created_at": r.created_at} for r in rows]
+            t = _ticket_for_write(session, ticket_id)
+            if not t:
+                return None
+            t.comment_count = comment_count
+            t.last_activity_at = _as_datetime(last_activity_at) or t.created_at
+            _record_change(session, "ticket", t.id)
+            session.commit()
+            session.refresh(t)
+            return _ticket_to_dict(t)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def archive_closed(self, closed_before: datetime, batch_size: int) -> int:
+        """Move one batch of tickets closed before `closed_before` to the archive.
+
+        The tickets and their comments are copied into the archive tables and
+        deleted from the hot tables in a single transaction. Returns the
+        number of tickets moved; callers loop until it returns 0.
+        """
+        session = self.session_factory()
+        try:
+            ids = [r.id for r in session.query(Ticket.id)
+                   .filter(Ticket.status == Status.CLOSED, Ticket.closed_at < closed_before)
+                   .order_by(Ticket.closed_at)
+                   .limit(batch_size)]
+            if not ids:
+                return 0
+            now = datetime.now(timezone.utc)
+            _copy_to_archive(session, Ticket, ArchivedTicket, Ticket.id.in_(ids), now)
+            _copy_to_archive(session, Comment, ArchivedComment, Comment.ticket_id.in_(ids), now)
+            session.query(Comment).filter(Comment.ticket_id.in_(ids)).delete(synchronize_session=False)
+            session.query(Ticket).filter(Ticket.id.in_(ids)).delete(synchronize_session=False)
+            session.commit()
+            return len(ids)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def list(self, sort: Optional[str] = None, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Return all hot (non-archived) tickets; `sort="recent"` orders by last activity
+        (index-backed), `sort="created"` by creation time, oldest first.
+
+        When `fields` is given only those columns are selected.
+        """
+        session = _read_session(self.session_factory)
+        try:
+            query = session.query(*_ticket_columns(fields)) if fields else session.query(Ticket)
+            if sort == "recent":
+                query = query.order_by(Ticket.last_activity_at.desc(), Ticket.id.desc())
+            elif sort == "created":
+                query = query.order_by(Ticket.created_at, Ticket.id)
+            rows = query.all()
+            if fields:
+                return [dict(r._mapping) for r in rows]
+            return [_ticket_to_dict(r) for r in rows]
         except Exception:
             try:
                 session.rollback()
@@ -115,21 +426,71 @@ class TicketRepo:
         finally:
             session.close()
 
+class CommitFailed(RuntimeError):
+    """Raised by `save_many` when the commit itself fails.
+
+    The outcome is unknown (the server may have applied it), so the batch
+    must not be retried row by row.
+    """
+
 class CommentRepo:
     def __init__(self, session_factory: Callable):
         self.session_factory = session_factory
 
     def save(self, data: Dict) -> Dict:
+        """Insert a comment and bump the parent ticket's counters in the same transaction."""
         session = self.session_factory()
         try:
+            data = dict(data, created_at=_as_datetime(data.get("created_at")) or datetime.now(timezone.utc))
             c = Comment(**data)
             session.add(c)
+            _bump_ticket_comments(session, c.ticket_id, 1, c.created_at)
+            session.flush()
+            _record_change(session, "comment", c.id)
+            _bump_activity(session, "commented", c.created_at)
             session.commit()
             session.refresh(c)
-            return {"id": c.id, "ticket_id": c.ticket_id, "user_emai": c.user_email, "content": c.content, "created_at": c.created_at}
+            return _comment_to_dict(c)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def save_many(self, rows: Sequence[Dict]) -> List[Dict]:
+        """Insert several comments in one transaction and return them in input order.
+
+        The comments go in as one multi-row INSERT ... RETURNING; ticket
+        counters, change-log entries and activity counts are applied once
+        per ticket and hour rather than once per comment.
+        """
+        session = self.session_factory()
+        try:
+            now = datetime.now(timezone.utc)
+            rows = [dict(r, created_at=_as_datetime(r.get("created_at")) or now) for r in rows]
+            comments = session.scalars(insert(Comment).returning(Comment, sort_by_parameter_order=True), rows).all()
+            latest: Dict[int, datetime] = {}
+            counts = Counter(c.ticket_id for c in comments)
+            for c in comments:
+                latest[c.ticket_id] = max(latest.get(c.ticket_id, c.created_at), c.created_at)
+            # Fixed lock order, so concurrent batches cannot deadlock on shared tickets
+            for ticket_id in sorted(counts):
+                _bump_ticket_comments(session, ticket_id, counts[ticket_id], latest[ticket_id])
+            for c in comments:
+                _record_change(session, "comment", c.id)
+            for bucket, n in Counter(hour_bucket(c.created_at) for c in comments).items():
+                _bump_activity(session, "commented", bucket, n)
+            result = [_comment_to_dict(c) for c in comments]
         except Exception as e:
             session.rollback()
+            session.close()
             raise e
+        try:
+            session.commit()
+            return result
+        except Exception as e:
+            session.rollback()
+            raise CommitFailed(f"committing {len(rows)} comments failed: {e}") from e
         finally:
             session.close()
 
@@ -137,11 +498,13 @@ class CommentRepo:
         """Delete a comment by id and return the deleted record dict, or None if missing."""
         session = self.session_factory()
         try:
-            c = session.query(Comment).get(comment_id)
+            c = _comment_for_write(session, comment_id)
             if not c:
                 return None
-            result = {"id": c.id, "ticket_id": c.ticket_id, "user_email": c.user_email, "content": c.content, "created_at": c.created_at}
+            result = _comment_to_dict(c)
             session.delete(c)
+            _bump_ticket_comments(session, c.ticket_id, -1)
+            _record_change(session, "comment", comment_id, "delete")
             session.commit()
             return result
         except Exception as e:
@@ -151,20 +514,24 @@ class CommentRepo:
             session.close()
 
     def get(self, cid: int) -> Optional[Dict]:
-        session = self.session_factory()
+        session = _read_session(self.session_factory)
         try:
             c = session.query(Comment).get(cid)
             if not c:
                 return None
-            return {"id": c.id, "ticket_id": c.ticket_id, "user_email": c.user_email, "content": c.content, "created_at": c.created_at}
+            return _comment_to_dict(c)
         finally:
             session.close()
 
     def list_for_ticket(self, ticket_id: int) -> List[Dict]:
-        session = self.session_factory()
+        """Return a ticket's comments, hot and archived, ordered by id.
+
+        Archived tickets can still take new comments, so both tables are read.
+        """
+        session = _read_session(self.session_factory)
         try:
-            rows = session.query(Comment).filter(Comment.ticket_id == ticket_id).all()
-            return [{"id": r.id, "ticket_id": r.ticket_id, "user_email": r.user_email, "content": r.content, "created_at": r.created_at} for r in rows]
+            rows = [r for model in (Comment, ArchivedComment) for r in session.query(model).filter(model.ticket_id == ticket_id)]
+            return sorted((_comment_to_dict(r) for r in rows), key=lambda c: c["id"])
         except Exception:
             try:
                 session.rollback()
@@ -174,16 +541,58 @@ class CommentRepo:
         finally:
             session.close()
             
+    def list_page(self, ticket_id: int, limit: int, before: Optional[tuple] = None) -> List[Dict]:
+        """Return up to `limit` of a ticket's comments, newest first.
+
+        `before` is the `(created_at, id)` of the last comment of the
+        previous page. The row-value comparison plus `ORDER BY created_at
+        DESC, id DESC` is a range scan on `ix_comments_ticket_created_id`,
+        so deep pages cost the same as the first one. The archive table is
+        paged the same way and the two pages are merged, since archived
+        tickets can still take new comments.
+        """
+        session = _read_session(self.session_factory)
+        try:
+            rows = []
+            for model in (Comment, ArchivedComment):
+                query = session.query(model).filter(model.ticket_id == ticket_id)
+                if before is not None:
+                    query = query.filter(tuple_(model.created_at, model.id) < (_as_datetime(before[0]), before[1]))
+                rows.extend(query.order_by(model.created_at.desc(), model.id.desc()).limit(limit))
+            rows.sort(key=lambda r: (r.created_at, r.id), reverse=True)
+            return [_comment_to_dict(r) for r in rows[:limit]]
+        finally:
+            session.close()
+
+    def list_for_tickets(self, ticket_ids: Sequence[int]) -> Dict[int, List[Dict]]:
+        """Return comments for several tickets keyed by ticket id, ordered by id.
+
+        One `IN` query on the hot table and one on the archive, whose
+        results are merged per ticket.
+        """
+        session = _read_session(self.session_factory)
+        try:
+            grouped: Dict[int, List[Dict]] = {tid: [] for tid in ticket_ids}
+            for model in (Comment, ArchivedComment):
+                for r in session.query(model).filter(model.ticket_id.in_(list(grouped))):
+                    grouped[r.ticket_id].append(_comment_to_dict(r))
+            for comments in grouped.values():
+                comments.sort(key=lambda c: c["id"])
+            return grouped
+        finally:
+            session.close()
+
     def update_content(self, comment_id: int, new_content: str) -> Optional[Dict]:
         session = self.session_factory()
         try:
-            c = session.query(Comment).get(comment_id)
+            c = _comment_for_write(session, comment_id)
             if not c:
                 return None
             c.content = new_content
+            _record_change(session, "comment", c.id)
             session.commit()
             session.refresh(c)
-            return {"id": c.id, "ticket_id": c.ticket_id, "user_email": c.user_email, "content": c.content, "created_at": c.created_at}
+            return _comment_to_dict(c)
         except Exception as e:
             session.rollback()
             raise e
@@ -191,10 +600,10 @@ class CommentRepo:
             session.close()
 
     def list_all(self) -> List[Dict]:
-        session = self.session_factory()
+        session = _read_session(self.session_factory)
         try:
             rows = session.query(Comment).all()
-            return [{"id": r.id, "ticket_id": r.ticket_id, "user_email": r.user_email, "content": r.content, "created_at": r.created_at} for r in rows]
+            return [_comment_to_dict(r) for r in rows]
         except Exception:
             try:
                 session.rollback()
@@ -204,6 +613,108 @@ class CommentRepo:
         finally:
             session.close()
 
+class ActivityRepo:
+    """Read and rebuild the hourly `activity_rollup` table."""
+    def __init__(self, session_factory: Callable):
+        self.session_factory = session_factory
+
+    def hourly_counts(self, since: datetime) -> List[Dict]:
+        """Return rollup rows with `bucket_start >= since`, oldest first (a primary-key range scan)."""
+        session = _read_session(self.session_factory)
+        try:
+            rows = (session.query(ActivityRollup)
+                    .filter(ActivityRollup.bucket_start >= hour_bucket(since))
+                    .order_by(ActivityRollup.bucket_start, ActivityRollup.metric))
+            return [{"bucket_start": r.bucket_start, "metric": r.metric, "count": r.count} for r in rows]
+        finally:
+            session.close()
+
+    def rebuild(self, since: datetime) -> int:
+        """Recompute rollup rows from `since` onwards from the hot and archive tables.
+
+        Used to backfill history written before the rollup existed or to
+        repair drift. Timestamps are streamed and bucketed in Python so the
+        same code works on every backend; returns the number of rows written.
+        Closures are counted from the current `closed_at`, so a ticket that
+        was closed and reopened is not counted.
+        """
+        since = hour_bucket(since)
+        sources = (
+            ("created", Ticket.created_at), ("created", ArchivedTicket.created_at),
+            ("closed", Ticket.closed_at), ("closed", ArchivedTicket.closed_at),
+            ("commented", Comment.created_at), ("commented", ArchivedComment.created_at),
+        )
+        session = self.session_factory()
+        try:
+            counts: Counter = Counter()
+            for metric, column in sources:
+                for (at,) in session.query(column).filter(column >= since).yield_per(1000):
+                    counts[(hour_bucket(at), metric)] += 1
+            session.query(ActivityRollup).filter(ActivityRollup.bucket_start >= since).delete(synchronize_session=False)
+            session.bulk_insert_mappings(ActivityRollup, [
+                {"bucket_start": bucket, "metric": metric, "count": n} for (bucket, metric), n in counts.items()
+            ])
+            session.commit()
+            return len(counts)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+class ChangeRepo:
+    """Read side of the change log used by the incremental sync endpoint and the change relay."""
+    def __init__(self, session_factory: Callable):
+        self.session_factory = session_factory
+
+    def last_seq(self) -> int:
+        """Return the newest change-log seq, or 0 if the log is empty."""
+        session = _read_session(self.session_factory)
+        try:
+            return session.query(func.max(ChangeLog.seq)).scalar() or 0
+        finally:
+            session.close()
+
+    def changes_since(self, since: int, limit: int) -> Dict:
+        """Return up to `limit` changes with `seq > since`, in sequence order.
+
+        Uses the change-log primary key for the range scan and one `IN`
+        query per entity type for the current rows, so the cost follows the
+        number of changes rather than table size. Deleted entities come back
+        as tombstones with `data: None`.
+        """
+        session = _read_session(self.session_factory)
+        try:
+            entries = (
+                session.query(ChangeLog)
+                .filter(ChangeLog.seq > since)
+                .order_by(ChangeLog.seq)
+                .limit(limit + 1)
+                .all()
+            )
+            has_more = len(entries) > limit
+            entries = entries[:limit]
+            wanted = {"ticket": set(), "comment": set()}
+            for e in entries:
+                if e.op != "delete":
+                    wanted[e.entity].add(e.entity_id)
+            rows = {"ticket": {}, "comment": {}}
+            # Archived records keep their change-log entries, so fall through to the archive
+            sources = {"ticket": ((Ticket, ArchivedTicket), _ticket_to_dict), "comment": ((Comment, ArchivedComment), _comment_to_dict)}
+            for entity, (models, to_dict) in sources.items():
+                for model in models:
+                    missing = wanted[entity] - rows[entity].keys()
+                    if missing:
+                        rows[entity].update({r.id: to_dict(r) for r in session.query(model).filter(model.id.in_(missing))})
+            changes = [
+                {"seq": e.seq, "entity": e.entity, "id": e.entity_id, "op": e.op,
+                 "data": None if e.op == "delete" else rows[e.entity].get(e.entity_id)}
+                for e in entries
+            ]
+            return {"changes": changes, "next_since": entries[-1].seq if entries else since, "has_more": has_more}
+        finally:
+            session.close()
+
 class UserRepo:
     def __init__(self, session_factory: Callable):
         self.session_factory = session_factory
@@ -215,6 +726,7 @@ class UserRepo:
             from app.db.models import User
             user = User(**data)
             session.add(user)
+            _bump_cache_version(session, "users")
             session.commit()
             session.refresh(user)
             return {"id": user.id, "email": user.email, "role": user.role, "created_at": user.created_at}
@@ -229,11 +741,12 @@ class UserRepo:
         session = self.session_factory()
         try:
             from app.db.models import User
-            u = session.query(User).filter(User.email == email).first()
+            u = session.query(User).filter(func.lower(User.email) == email.lower()).first()
             if not u:
                 return None
             result = {"id": u.id, "email": u.email, "role": u.role, "created_at": u.created_at}
             session.delete(u)
+            _bump_cache_version(session, "users")
             session.commit()
             return result
         except Exception as e:
@@ -242,8 +755,16 @@ class UserRepo:
         finally:
             session.close()
 
+    def cache_version(self) -> int:
+        """Current version of the "users" cache; it changes on every committed user write."""
+        session = _read_session(self.session_factory)
+        try:
+            return session.query(CacheVersion.version).filter(CacheVersion.name == "users").scalar() or 0
+        finally:
+            session.close()
+
     def get(self, uid: int) -> Optional[Dict]:
-        session = self.session_factory()
+        session = _read_session(self.session_factory)
         try:
             from app.db.models import User
             u = session.query(User).get(uid)
@@ -254,18 +775,28 @@ class UserRepo:
             session.close()
 
     def get_by_email(self, email: str) -> Optional[Dict]:
-        session = self.session_factory()
+        session = _read_session(self.session_factory)
         try:
             from app.db.models import User
-            u = session.query(User).filter(User.email == email).first()
+            u = session.query(User).filter(func.lower(User.email) == email.lower()).first()
             if not u:
                 return None
             return {"id": u.id, "email": u.email, "role": u.role, "created_at": u.created_at}
         finally:
             session.close()
 
+    def get_many_by_email(self, emails: Sequence[str]) -> Dict[str, Dict]:
+        """Return the users for `emails` keyed by lowercased email with one `IN` query."""
+        session = _read_session(self.session_factory)
+        try:
+            from app.db.models import User
+            rows = session.query(User).filter(func.lower(User.email).in_({e.lower() for e in emails})).all()
+            return {u.email.lower(): {"id": u.id, "email": u.email, "role": u.role, "created_at": u.created_at} for u in rows}
+        finally:
+            session.close()
+
     def list(self) -> List[Dict]:
-        session = self.session_factory()
+        session = _read_session(self.session_factory)
         try:
             from app.db.models import User
             rows = session.query(User).all()
@@ -283,10 +814,11 @@ class UserRepo:
         session = self.session_factory()
         try:
             from app.db.models import User
-            u = session.query(User).filter(User.email == email).first()
+            u = session.query(User).filter(func.lower(User.email) == email.lower()).first()
             if not u:
                 return None
             u.role = new_role
+            _bump_cache_version(session, "users")
             session.commit()
             session.refresh(u)
             return {"id": u.id, "email": u.email, "role": u.role, "created_at": u.created_at}
@@ -295,3 +827,96 @@ class UserRepo:
             raise ValueError(f"Error updating user role: {e}")
         finally:
             session.close()
+
+
+def _job_to_dict(j: Job) -> Dict:
+    return {"id": j.id, "kind": j.kind, "status": j.status, "params": json.loads(j.params) if j.params else {},
+            "progress": j.progress, "total": j.total, "result": json.loads(j.result) if j.result else None,
+            "error": j.error, "created_at": j.created_at, "updated_at": j.updated_at}
+
+class JobRepo:
+    """Persist background job state; `params` and `result` are stored as JSON."""
+    def __init__(self, session_factory: Callable):
+        self.session_factory = session_factory
+
+    def save(self, data: Dict) -> Dict:
+        session = self.session_factory()
+        try:
+            j = Job(kind=data["kind"], status=data["status"], params=json.dumps(data.get("params") or {}, default=str),
+                    owner=data.get("owner"), heartbeat_at=datetime.now(timezone.utc))
+            session.add(j)
+            session.commit()
+            session.refresh(j)
+            return _job_to_dict(j)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        session = _read_session(self.session_factory)
+        try:
+            j = session.query(Job).get(job_id)
+            if not j:
+                return None
+            return _job_to_dict(j)
+        finally:
+            session.close()
+
+    def update(self, job_id: int, **fields) -> Optional[Dict]:
+        """Update status/progress/total/result/error of a job and return it."""
+        session = self.session_factory()
+        try:
+            j = session.query(Job).get(job_id)
+            if not j:
+                return None
+            for key, value in fields.items():
+                setattr(j, key, json.dumps(value, default=str) if key == "result" else value)
+            j.updated_at = datetime.now(timezone.utc)
+            session.commit()
+            session.refresh(j)
+            return _job_to_dict(j)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def heartbeat(self, owner: str) -> int:
+        """Renew the lease on the unfinished jobs of `owner`; return how many there are."""
+        session = self.session_factory()
+        try:
+            count = session.query(Job).filter(Job.owner == owner, Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING])).update(
+                {Job.heartbeat_at: datetime.now(timezone.utc)}, synchronize_session=False,
+            )
+            session.commit()
+            return count
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def fail_unfinished(self, reason: str, stale_before: Optional[datetime] = None) -> int:
+        """Mark pending/running jobs as failed.
+
+        With `stale_before`, only jobs whose owner last heartbeated before it
+        (or never) are failed, so jobs of live workers are left alone.
+        """
+        session = self.session_factory()
+        try:
+            query = session.query(Job).filter(Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING]))
+            if stale_before is not None:
+                query = query.filter(or_(Job.heartbeat_at.is_(None), Job.heartbeat_at < stale_before))
+            count = query.update(
+                {Job.status: JobStatus.FAILED, Job.error: reason, Job.updated_at: datetime.now(timezone.utc)},
+                synchronize_session=False,
+            )
+            session.commit()
+            return count
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
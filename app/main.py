@@ -1,44 +1,119 @@
-from contextlib import asynccontextmanager
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
 from fastapi import FastAPI
 from app.api.routes.tickets import router as tickets_router
 from app.api.routes.comments import router as comments_router
 from app.api.routes.users import router as users_router
 from app.api.routes.auth import router as auth_router
-from app.db.engine import init_db
+from app.api.routes.sync import router as sync_router
+from app.api.routes.jobs import router as jobs_router
+from app.api.routes.metrics import router as metrics_router
+from app.api.routes.reports import router as reports_router
+from app.api.middleware import AdmissionControlMiddleware, ProfilingMiddleware, read_your_writes_middleware, request_id_middleware
+from app.core.config import settings
+from app.core.journal import Journal
+from app.db.engine import SchemaOutOfDate, init_db
 from app.db import engine as db
-from app.db.repositories import CommentRepo, TicketRepo, UserRepo
 import app.services.ticket_service as ticket_service_mod
 import app.services.user_service as user_service_mod
 import app.services.comment_service as comment_service_mod
+import app.services.sync_service as sync_service_mod
+import app.services.job_service as job_service_mod
+import app.services.report_service as report_service_mod
+from app.services.event_bus import ChangeRelay, get_event_bus
+
+@contextmanager
+def _timed(timings: dict, phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = time.perf_counter() - started
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup actions
     print("Starting up the application...")
+    timings = {"imports": _APP_CREATED - _IMPORT_STARTED}
+    started = time.perf_counter()
+    journal = None
+    relay_task = None
     
     try:
-        init_db()
+        with _timed(timings, "init_db"):
+            init_db()
+        # Repos are only needed (and imported) when a database is configured
+        from app.db.repositories import ActivityRepo, ChangeRepo, CommentRepo, JobRepo, TicketRepo, UserRepo, changes_written_here
         comment_repo = CommentRepo(session_factory=db.SessionLocal)
         ticket_repo = TicketRepo(session_factory=db.SessionLocal)
         user_repo = UserRepo(session_factory=db.SessionLocal)
+        change_repo = ChangeRepo(session_factory=db.SessionLocal)
+        job_repo = JobRepo(session_factory=db.SessionLocal)
+        activity_repo = ActivityRepo(session_factory=db.SessionLocal)
 
         # Assign singletons on the service modules so dependencies read the initialized instances
         user_service_mod._user_service_singleton = user_service_mod.UserService(repo=user_repo)
         comment_service_mod._comment_service_singleton = comment_service_mod.CommentService(repo=comment_repo)
         ticket_service_mod._ticket_service_singleton = ticket_service_mod.TicketService(repo=ticket_repo, comment_service=comment_service_mod._comment_service_singleton)
+        sync_service_mod._sync_service_singleton = sync_service_mod.SyncService(repo=change_repo)
+        report_service_mod._report_service_singleton = report_service_mod.ReportService(repo=activity_repo)
+        job_service_mod._job_service_singleton = job_service_mod.JobService(repo=job_repo, ticket_service=ticket_service_mod._ticket_service_singleton)
+        if settings.EVENT_RELAY_POLL_MS > 0:
+            # Other workers' writes reach this worker's change stream through the change log
+            relay_task = asyncio.create_task(ChangeRelay(change_repo, get_event_bus(), changes_written_here).run())
+    except SchemaOutOfDate:
+        # A configured but stale database must not silently become the in-memory store
+        raise
     except Exception as e:
         print(f"Error during database initialization: {e}")
-        user_service_mod._user_service_singleton = user_service_mod.UserService()
-        comment_service_mod._comment_service_singleton = comment_service_mod.CommentService()
-        ticket_service_mod._ticket_service_singleton = ticket_service_mod.TicketService(comment_service=comment_service_mod._comment_service_singleton)
+        if settings.IN_MEMORY_DATA_DIR:
+            journal = Journal(settings.IN_MEMORY_DATA_DIR)
+        user_service_mod._user_service_singleton = user_service_mod.UserService(journal=journal)
+        comment_service_mod._comment_service_singleton = comment_service_mod.CommentService(journal=journal)
+        ticket_service_mod._ticket_service_singleton = ticket_service_mod.TicketService(
+            repo=ticket_service_mod.InMemoryRepo(journal=journal), comment_service=comment_service_mod._comment_service_singleton)
+        sync_service_mod._sync_service_singleton = sync_service_mod.SyncService()
+        report_service_mod._report_service_singleton = report_service_mod.ReportService()
+        job_service_mod._job_service_singleton = job_service_mod.JobService(ticket_service=ticket_service_mod._ticket_service_singleton)
+        if journal is not None:
+            sync_service_mod.get_change_log().attach(journal)
+            report_service_mod.get_activity_rollup().attach(journal)
+            with _timed(timings, "journal_load"):
+                loaded = journal.load()
+            print(f"Loaded {loaded} records from {settings.IN_MEMORY_DATA_DIR}")
+
+    timings["services"] = time.perf_counter() - started - timings.get("init_db", 0.0) - timings.get("journal_load", 0.0)
+    timings["total"] = sum(timings.values())
+    app.state.startup_timings = timings
+    print("Startup timings: " + " ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in timings.items()))
     
     yield
     # Shutdown actions
     print("Shutting down the application...")
+    if relay_task is not None:
+        relay_task.cancel()
+    await comment_service_mod.get_comment_service().drain()
+    job_service_mod.get_job_service().shutdown()
+    if journal is not None:
+        journal.close()
     
 app = FastAPI(title="Support Ticket Backend", lifespan=lifespan)
+app.middleware("http")(read_your_writes_middleware)
+app.middleware("http")(request_id_middleware)
+# Inside admission control, so shed requests are never profiled
+app.add_middleware(ProfilingMiddleware)
+# Added last so it is the outermost layer and sheds load before any other work
+app.add_middleware(AdmissionControlMiddleware)
+_APP_CREATED = time.perf_counter()
 
 app.include_router(tickets_router, prefix="/tickets", tags=["tickets"])
 app.include_router(comments_router, prefix="/comments", tags=["comments"])
 app.include_router(users_router, prefix="/users", tags=["users"])
-app.include_router(auth_router, prefix="/auth", tags=["auth"])
\ No newline at end of file
+app.include_router(auth_router, prefix="/auth", tags=["auth"])
+app.include_router(sync_router, prefix="/sync", tags=["sync"])
+app.include_router(jobs_router, prefix="/jobs", tags=["jobs"])
+app.include_router(metrics_router, prefix="/metrics", tags=["metrics"])
+app.include_router(reports_router, prefix="/reports", tags=["reports"])
\ No newline at end of file
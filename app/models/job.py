@@ -0,0 +1,36 @@
+from enum import Enum
+from typing import Any, Dict
+from pydantic import BaseModel, model_validator
+from app.models.ticket import TICKET_FIELDS
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class JobKind(str, Enum):
+    EXPORT_TICKETS = "export_tickets"
+    IMPORT_TICKETS = "import_tickets"
+    BULK_UPDATE_TICKETS = "bulk_update_tickets"
+    RECOUNT_COMMENTS = "recount_comments"
+    ARCHIVE_CLOSED_TICKETS = "archive_closed_tickets"
+    REBUILD_ACTIVITY_ROLLUP = "rebuild_activity_rollup"
+
+class JobCreate(BaseModel):
+    kind: JobKind
+    params: Dict[str, Any] = {}
+
+    @model_validator(mode="after")
+    def check_export_fields(self):
+        """Reject unknown `fields` at submission rather than exporting nothing later."""
+        fields = self.params.get("fields") if self.kind == JobKind.EXPORT_TICKETS else None
+        if fields is not None:
+            if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+                raise ValueError("fields must be a list of field names")
+            unknown = [f for f in fields if f not in TICKET_FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return self
@@ -0,0 +1,9 @@
+from enum import Enum
+
+
+class ReportGranularity(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+# Counters kept per hour in the activity rollup
+ACTIVITY_METRICS = ("created", "closed", "commented")
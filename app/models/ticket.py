@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from app.core.config import settings
 from app.models.comment import CommentCreate
 from enum import Enum
 
@@ -12,8 +14,23 @@ class Status(str, Enum):
     IN_PROGRESS = "in_progress"
     CLOSED = "closed"
 
+# Order in which `claim-next` hands out open tickets
+CLAIM_PRIORITY_ORDER = (Priority.HIGH, Priority.MEDIUM, Priority.LOW)
+
+# Columns a client may request through `fields=`; `id` is always returned.
+TICKET_FIELDS = ("id", "title", "description", "priority", "status", "created_at", "comment_count", "last_activity_at", "closed_at", "assignee")
+
+class TicketSort(str, Enum):
+    CREATED = "created"
+    RECENT = "recent"
+
 class TicketCreate(BaseModel):
     title: str
     description: str
     priority: Priority = Priority.MEDIUM
     status: Status = Status.OPEN
+
+class TicketBatchGet(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=settings.BATCH_GET_MAX)
+    fields: Optional[List[str]] = None
+    include: List[str] = []
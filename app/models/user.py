@@ -1,5 +1,7 @@
 from enum import Enum
-from pydantic import BaseModel
+from typing import List
+from pydantic import BaseModel, Field
+from app.core.config import settings
 
 
 class Role(str, Enum):
@@ -8,4 +10,7 @@ class Role(str, Enum):
 
 class UserCreate(BaseModel):
     email: str
-    role: Role = Role.USER
\ No newline at end of file
+    role: Role = Role.USER
+
+class UserBatchGet(BaseModel):
+    emails: List[str] = Field(..., min_length=1, max_length=settings.BATCH_GET_MAX)
@@ -4,11 +4,48 @@ Provides a consistent API for creating, retrieving and listing comments
 and supports either an in-memory store (default) or a repo-backed
 implementation (e.g., a DB repo). Use the repo parameter to delegate
 persistence to a different storage layer.
+
+A ticket's comments are paged newest first with keyset pagination on
+`(created_at, id)`: each page carries an opaque `next_cursor` naming the
+last comment returned, and the next page starts strictly after it.
+
+With a repo and `COMMENT_BATCH_SIZE` > 1, `create_comment` group-commits:
+concurrent creations are gathered by a `Batcher` for up to
+`COMMENT_BATCH_WAIT_MS` and written with one `repo.save_many` transaction.
 """
 
-from typing import Dict, Optional
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from app.core.batcher import Batcher
+from app.core.config import settings
+from app.core.journal import Journal
 from app.core.utils import now_iso
 from app.models.comment import CommentCreate
+from app.services.event_bus import EventBus, get_event_bus
+from app.services.report_service import InMemoryActivityRollup, get_activity_rollup
+from app.services.sync_service import InMemoryChangeLog, get_change_log
+
+
+def encode_cursor(comment: Dict) -> str:
+    """Opaque page cursor for the `(created_at, id)` position of `comment`."""
+    created_at = comment["created_at"]
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, comment["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Inverse of `encode_cursor`; raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, cid = json.loads(raw)
+        if not isinstance(created_at, str) or not isinstance(cid, int):
+            raise TypeError
+        return created_at, cid
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
 
 
 class CommentService:
@@ -21,13 +58,40 @@ class CommentService:
 
     Thread/process safety: the in-memory store is not safe for multi-
     process deployments; prefer a DB-backed repo in production.
+
+    Successful writes are published to `event_bus` (the shared bus by
+    default) as `comment.created/updated/deleted` events.
     """
-    def __init__(self, repo: Optional[object] = None):
+    def __init__(self, repo: Optional[object] = None, ticket_repo: Optional[object] = None, event_bus: Optional[EventBus] = None,
+                 change_log: Optional[InMemoryChangeLog] = None, rollup: Optional[InMemoryActivityRollup] = None,
+                 journal: Optional[Journal] = None, batch_size: Optional[int] = None, batch_wait: Optional[float] = None):
         # repo should implement save/get/list_for_ticket/list_all
         self.repo = repo
+        # Group commit of new comments; needs a repo with `save_many`
+        batch_size = settings.COMMENT_BATCH_SIZE if batch_size is None else batch_size
+        batch_wait = settings.COMMENT_BATCH_WAIT_MS / 1000 if batch_wait is None else batch_wait
+        self._batcher: Optional[Batcher] = None
+        if batch_size > 1 and hasattr(repo, "save_many"):
+            self._batcher = Batcher(self._save_batch, batch_size, batch_wait)
+        self.events = event_bus or get_event_bus()
+        # In-memory mode only: ticket repo implementing `record_comment_activity`,
+        # used to keep `comment_count`/`last_activity_at` on tickets current.
+        # DB repos maintain those columns in the comment transaction instead.
+        self.ticket_repo = ticket_repo
         if self.repo is None:
             self._store: Dict[int, Dict] = {}
-            self._next = 1 
+            self._next = 1
+            # Records in-memory writes for the sync endpoint; DB repos write `change_log` rows
+            self.change_log = change_log or get_change_log()
+            # Counts new comments for activity reports; DB repos bump `activity_rollup`
+            self.rollup = rollup or get_activity_rollup()
+            # Optional on-disk persistence of the in-memory store
+            self.journal = journal
+            if journal is not None:
+                journal.attach("comments", self._store, on_load=self._after_load)
+
+    def _after_load(self) -> None:
+        self._next = max(self._store, default=0) + 1
     
     async def create_comment(self, comment: CommentCreate) -> Dict:
         data = {
@@ -36,38 +100,121 @@ class CommentService:
             "content": comment.content,
             "created_at": now_iso()
         }
+        if self._batcher:
+            return self._publish("comment.created", await self._batcher.submit(data))
         if self.repo:
-            return self.repo.save(data)
+            return self._publish("comment.created", self.repo.save(data))
         cid = self._next
         self._next += 1
         data = {"id": cid, **data}
         self._store[cid] = data
-        return data
+        self.change_log.record("comment", cid, data)
+        if self.journal is not None:
+            self.journal.put("comments", cid, data)
+        self.rollup.bump("commented", data["created_at"])
+        if self.ticket_repo:
+            self.ticket_repo.record_comment_activity(data["ticket_id"], 1, data["created_at"])
+        return self._publish("comment.created", data)
     
+    async def drain(self) -> None:
+        """Write any batched comments still pending; call before shutdown."""
+        if self._batcher:
+            await self._batcher.drain()
+
+    def _save_batch(self, rows):
+        """Write a batch in one transaction; if that fails, save rows one by one so only bad rows fail.
+
+        A failed commit is raised to every caller instead: the batch may
+        have been applied, and saving it again would duplicate it.
+        """
+        from app.db.repositories import CommitFailed
+        try:
+            return self.repo.save_many(rows)
+        except CommitFailed:
+            raise
+        except Exception:
+            results = []
+            for row in rows:
+                try:
+                    results.append(self.repo.save(row))
+                except Exception as e:
+                    results.append(e)
+            return results
+
     def get_comment(self, comment_id: int):
         return self.repo.get(comment_id) if self.repo else self._store.get(comment_id)
     
     def list_comments(self):
-        return self.repo.list_all() if self.repo else list(self._store.values())
+        return self.repo.list_all() if self.repo else self._snapshot()
     
     def update_comment_content(self, comment_id: int, new_content: str):
         if self.repo:
-            return self.repo.update_content(comment_id, new_content)
+            return self._publish("comment.updated", self.repo.update_content(comment_id, new_content))
         comment = self._store.get(comment_id)
         if not comment:
             return None
         comment["content"] = new_content
-        return comment
+        self.change_log.record("comment", comment_id, comment)
+        if self.journal is not None:
+            self.journal.put("comments", comment_id, comment)
+        return self._publish("comment.updated", comment)
 
     def delete_comment(self, comment_id: int):
         """Delete a comment and return deleted record or None."""
         if self.repo:
-            return self.repo.delete(comment_id)
+            return self._publish("comment.deleted", self.repo.delete(comment_id))
         comment = self._store.pop(comment_id, None)
+        if comment:
+            self.change_log.record("comment", comment_id, op="delete")
+            if self.journal is not None:
+                self.journal.delete("comments", comment_id)
+        if comment and self.ticket_repo:
+            self.ticket_repo.record_comment_activity(comment["ticket_id"], -1)
+        return self._publish("comment.deleted", comment)
+
+    def _snapshot(self):
+        """The in-memory comments as a list; job threads read while the event loop writes."""
+        return list(self._store.values())
+
+    def _publish(self, event_type: str, comment: Optional[Dict]) -> Optional[Dict]:
+        """Publish `comment` to the event bus if the write succeeded, and return it."""
+        if comment:
+            self.events.publish(event_type, comment)
         return comment
 
     def list_comments_for_ticket(self, ticket_id: int):
-        return self.repo.list_for_ticket(ticket_id) if self.repo else [c for c in self._store.values() if c["ticket_id"] == ticket_id]
+        return self.repo.list_for_ticket(ticket_id) if self.repo else [c for c in self._snapshot() if c["ticket_id"] == ticket_id]
+
+    def list_comments_page(self, ticket_id: int, limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict:
+        """Return one page of a ticket's comments, newest first.
+
+        Returns `{"comments": [...], "next_cursor": str | None}`; pass
+        `next_cursor` back as `cursor` for the following (older) page.
+        Raises ValueError for a malformed cursor.
+        """
+        limit = max(1, min(limit or settings.COMMENTS_PAGE_SIZE, settings.COMMENTS_PAGE_MAX))
+        before = decode_cursor(cursor) if cursor else None
+        if self.repo:
+            # One extra row tells whether another page follows
+            rows = self.repo.list_page(ticket_id, limit + 1, before)
+        else:
+            rows = sorted((c for c in self._snapshot() if c["ticket_id"] == ticket_id),
+                          key=lambda c: (c["created_at"], c["id"]), reverse=True)
+            if before is not None:
+                rows = [c for c in rows if (c["created_at"], c["id"]) < before]
+            rows = rows[:limit + 1]
+        comments = rows[:limit]
+        return {"comments": comments, "next_cursor": encode_cursor(comments[-1]) if len(rows) > limit else None}
+
+    def list_comments_for_tickets(self, ticket_ids) -> Dict[int, list]:
+        """Return comments for several tickets keyed by ticket id in one pass."""
+        if self.repo:
+            return self.repo.list_for_tickets(ticket_ids)
+        grouped = {tid: [] for tid in ticket_ids}
+        for c in self._snapshot():
+            if c["ticket_id"] in grouped:
+                grouped[c["ticket_id"]].append(c)
+        return grouped
     
     
 # FastAPI dependency provider
@@ -0,0 +1,185 @@
+"""In-process publish/subscribe bus for ticket and comment changes.
+
+Services publish an event after every successful write; the SSE endpoint
+(`GET /tickets/events`) subscribes and streams them to clients so agent
+consoles can push-subscribe instead of polling the list endpoints.
+
+Each subscriber gets its own bounded queue. A subscriber that falls more
+than `queue_size` events behind is dropped rather than allowed to buffer
+without limit or slow down publishers; its stream ends and the client is
+expected to reconnect with `Last-Event-ID`. Recent events are kept in a
+short ring buffer so reconnecting clients can resume without a gap.
+
+The bus is process-local: with several workers each one has its own bus.
+In DB mode `ChangeRelay` polls the shared change log and publishes other
+workers' writes to the local bus as well. The change log keeps only the
+latest change per record, so relayed creations and updates both arrive as
+`<entity>.updated`, and deletions as `<entity>.deleted` with just the id.
+"""
+
+import asyncio
+import logging
+import weakref
+from collections import deque
+from threading import Lock
+from typing import Callable, Deque, Dict, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger("app.services.event_bus")
+
+
+class Subscriber:
+    """A single consumer of the bus, backed by an asyncio queue.
+
+    `dropped` is set when the subscriber could not keep up; the queue then
+    receives a final `None` sentinel so the consumer wakes up and stops.
+    """
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.loop = asyncio.get_running_loop()
+        self.dropped = False
+
+    def offer(self, event: Optional[Dict]) -> bool:
+        """Enqueue `event`; return False if the subscriber is too far behind."""
+        if self.dropped:
+            return False
+        if event is not None and self.queue.qsize() >= self.queue_size:
+            self.dropped = True
+            event = None
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.queue.put_nowait(event)
+        else:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        return not self.dropped
+
+    async def get(self) -> Optional[Dict]:
+        return await self.queue.get()
+
+
+class EventBus:
+    """Fan out change events to subscribers and keep a short replay buffer."""
+    def __init__(self, queue_size: Optional[int] = None, buffer_size: Optional[int] = None):
+        self.queue_size = queue_size or settings.EVENT_QUEUE_SIZE
+        self._buffer: Deque[Dict] = deque(maxlen=buffer_size or settings.EVENT_BUFFER_SIZE)
+        self._subscribers: List[Subscriber] = []
+        self._listeners: List[weakref.WeakMethod] = []
+        self._next_id = 1
+        self._lock = Lock()
+
+    def publish(self, event_type: str, data: Dict) -> Dict:
+        """Record an event and deliver it to every live subscriber."""
+        with self._lock:
+            event = {"id": self._next_id, "type": event_type, "data": dict(data)}
+            self._next_id += 1
+            self._buffer.append(event)
+            subscribers = list(self._subscribers)
+            listeners = [ref() for ref in self._listeners]
+        for listener in listeners:
+            if listener is not None:
+                listener(event)
+        for sub in subscribers:
+            if not sub.offer(event):
+                self.unsubscribe(sub)
+        return event
+
+    def add_listener(self, method: Callable[[Dict], None]) -> None:
+        """Call the bound `method` synchronously, in the publisher's thread, for every event.
+
+        Only a weak reference is kept, so listeners do not keep their owner alive.
+        """
+        with self._lock:
+            self._listeners = [ref for ref in self._listeners if ref() is not None]
+            self._listeners.append(weakref.WeakMethod(method))
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscriber:
+        """Register a subscriber, replaying buffered events after `last_event_id`.
+
+        If the requested id has already fallen out of the buffer, or the
+        missed events would not fit in the subscriber's queue, a single
+        `reset` event carrying the latest id is queued instead, telling the
+        client to refetch state and resume from there.
+        Must be called from within the event loop that will consume it.
+        """
+        sub = Subscriber(self.queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                oldest = self._buffer[0]["id"] if self._buffer else self._next_id
+                missed = [event for event in self._buffer if event["id"] > last_event_id]
+                if last_event_id < oldest - 1 or len(missed) > self.queue_size:
+                    sub.queue.put_nowait({"id": self._next_id - 1, "type": "reset", "data": {}})
+                else:
+                    for event in missed:
+                        sub.queue.put_nowait(event)
+            self._subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+class ChangeRelay:
+    """Publish changes committed by other worker processes to the local bus.
+
+    Polls `repo.changes_since` (a `ChangeRepo`) every `interval` seconds,
+    starting from the newest entry at startup, and skips the entries for
+    which `is_local(seq)` is true, since their writer already published them.
+    """
+    def __init__(self, repo, bus: EventBus, is_local: Callable[[int], bool], interval: Optional[float] = None,
+                 batch_size: int = 500):
+        self.repo = repo
+        self.bus = bus
+        self.is_local = is_local
+        self.interval = settings.EVENT_RELAY_POLL_MS / 1000 if interval is None else interval
+        self.batch_size = batch_size
+        self.cursor: Optional[int] = None
+
+    async def run(self) -> None:
+        """Relay changes until cancelled."""
+        while True:
+            try:
+                await self.poll_once()
+            except Exception:
+                logger.exception("Change relay poll failed")
+            await asyncio.sleep(self.interval)
+
+    async def poll_once(self) -> int:
+        """Publish the foreign changes committed since the last poll; return how many."""
+        if self.cursor is None:
+            self.cursor = await asyncio.to_thread(self.repo.last_seq)
+            return 0
+        relayed = 0
+        while True:
+            page = await asyncio.to_thread(self.repo.changes_since, self.cursor, self.batch_size)
+            for change in page["changes"]:
+                if self.is_local(change["seq"]):
+                    continue
+                if change["op"] == "delete":
+                    self.bus.publish(f"{change['entity']}.deleted", {"id": change["id"]})
+                elif change["data"] is not None:
+                    self.bus.publish(f"{change['entity']}.updated", change["data"])
+                else:
+                    continue  # deleted again since
+                relayed += 1
+            self.cursor = page["next_since"]
+            if not page["has_more"]:
+                return relayed
+
+
+# Shared bus used by the services and the SSE route
+_event_bus_singleton: Optional[EventBus] = None
+def get_event_bus() -> EventBus:
+    global _event_bus_singleton
+    if _event_bus_singleton is None:
+        _event_bus_singleton = EventBus()
+    return _event_bus_singleton
@@ -0,0 +1,301 @@
+"""Background job service.
+
+Runs long bulk operations (exports, imports, bulk updates, comment
+recounts, archiving, activity rollup rebuilds) on a bounded thread pool instead of inside the
+request, so API workers stay responsive and heavy work runs with
+controlled concurrency.
+
+Job state (status, progress, result, error) is persisted through a repo:
+`JobRepo` in DB mode or `InMemoryJobRepo` otherwise. Cancellation is
+cooperative: pending jobs are dropped from the queue, running jobs stop
+at their next progress checkpoint. A job owned by another worker process
+is cancelled through its row, which its worker polls while running.
+
+In DB mode each job row records the worker that owns it. Every worker
+renews the lease on its unfinished jobs every third of
+`JOB_LEASE_SECONDS` and fails unfinished jobs whose lease has lapsed, so
+jobs of a worker that died are failed without touching those of live
+workers.
+"""
+
+import logging
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Optional
+from app.core.config import settings
+from app.core.utils import now_iso
+from app.models.job import JobKind, JobStatus
+from app.models.ticket import TicketCreate
+from app.services.report_service import get_report_service
+from app.services.ticket_service import TicketService, get_ticket_service
+
+
+logger = logging.getLogger("app.services.job_service")
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already pending or running."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job has been cancelled."""
+
+
+class InMemoryJobRepo:
+    """Thread-safe in-memory job store mirroring `JobRepo`."""
+    def __init__(self):
+        self._store: Dict[int, Dict] = {}
+        self._next = 1
+        self._lock = Lock()
+
+    def save(self, data: Dict) -> Dict:
+        with self._lock:
+            jid = self._next
+            self._next += 1
+            job = {"id": jid, "kind": data["kind"], "status": data["status"], "params": data.get("params") or {},
+                   "progress": 0, "total": None, "result": None, "error": None,
+                   "created_at": now_iso(), "updated_at": now_iso()}
+            self._store[jid] = job
+            return dict(job)
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        with self._lock:
+            job = self._store.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id: int, **fields) -> Optional[Dict]:
+        with self._lock:
+            job = self._store.get(job_id)
+            if not job:
+                return None
+            job.update(fields, updated_at=now_iso())
+            return dict(job)
+
+    def fail_unfinished(self, reason: str, stale_before: Optional[datetime] = None) -> int:
+        return 0
+
+
+class JobContext:
+    """Handle passed to job handlers for progress reporting and cancellation.
+
+    Progress writes, and reads of the job row for cancellation by another
+    worker, are throttled to one every `flush_interval` seconds so a tight
+    loop does not turn into a repo call per item.
+    """
+    def __init__(self, job_id: int, repo, cancel_event: Event, flush_interval: float = 0.5):
+        self.job_id = job_id
+        self.repo = repo
+        self.cancel_event = cancel_event
+        self.flush_interval = flush_interval
+        self.progress = 0
+        self.total: Optional[int] = None
+        self._last_flush = 0.0
+        self._last_poll = 0.0
+
+    def set_total(self, total: int) -> None:
+        self.total = total
+        self.repo.update(self.job_id, total=total)
+
+    def advance(self, step: int = 1) -> None:
+        """Record progress and stop the handler if the job was cancelled."""
+        self.progress += step
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._last_flush = now
+            self.repo.update(self.job_id, progress=self.progress)
+        self.check_cancelled()
+
+    def check_cancelled(self) -> None:
+        if not self.cancel_event.is_set():
+            now = time.monotonic()
+            if now - self._last_poll >= self.flush_interval:
+                self._last_poll = now
+                job = self.repo.get(self.job_id)
+                if job and job["status"] == JobStatus.CANCELLED:
+                    self.cancel_event.set()
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+
+def export_tickets(ctx: JobContext, tickets: TicketService, params: Dict):
+    """Export all tickets, optionally projected to `fields` and with comments."""
+    rows = tickets.list_tickets(include_comments=bool(params.get("include_comments")), fields=params.get("fields"))
+    ctx.set_total(len(rows))
+    exported = []
+    for row in rows:
+        exported.append(row)
+        ctx.advance()
+    return {"tickets": exported}
+
+def import_tickets(ctx: JobContext, tickets: TicketService, params: Dict):
+    """Create tickets from `params["tickets"]`, a list of `TicketCreate` payloads."""
+    payloads = [TicketCreate(**p) for p in params.get("tickets", [])]
+    ctx.set_total(len(payloads))
+    created = []
+    for payload in payloads:
+        created.append(tickets.create_ticket(payload)["id"])
+        ctx.advance()
+    return {"created": created}
+
+def bulk_update_tickets(ctx: JobContext, tickets: TicketService, params: Dict):
+    """Set `status` and/or `priority` on every ticket in `params["ticket_ids"]`."""
+    ids = params.get("ticket_ids", [])
+    ctx.set_total(len(ids))
+    updated, missing = 0, []
+    for tid in ids:
+        found = True
+        if params.get("status") is not None:
+            found = tickets.update_ticket_status(tid, params["status"]) is not None
+        if found and params.get("priority") is not None:
+            found = tickets.update_ticket_priority(tid, params["priority"]) is not None
+        if found:
+            updated += 1
+        else:
+            missing.append(tid)
+        ctx.advance()
+    return {"updated": updated, "missing": missing}
+
+def recount_comments(ctx: JobContext, tickets: TicketService, params: Dict):
+    """Recompute denormalized comment counters for `ticket_ids` (default: all)."""
+    ids = params.get("ticket_ids") or [t["id"] for t in tickets.list_tickets(include_comments=False, fields=("id",))]
+    ctx.set_total(len(ids))
+    for tid in ids:
+        tickets.recount_comments(tid)
+        ctx.advance()
+    return {"recounted": len(ids)}
+
+def archive_closed_tickets(ctx: JobContext, tickets: TicketService, params: Dict):
+    """Move tickets closed longer than `older_than_days` to the archive tables."""
+    moved = tickets.archive_closed_tickets(params.get("older_than_days"), params.get("batch_size"), on_batch=ctx.advance)
+    return {"archived": moved}
+
+def rebuild_activity_rollup(ctx: JobContext, tickets: TicketService, params: Dict):
+    """Recompute the last `days` days of the activity rollup from the raw tables."""
+    rows = get_report_service().rebuild_rollup(params.get("days"))
+    ctx.advance(rows)
+    return {"rows": rows}
+
+JOB_HANDLERS: Dict[str, Callable] = {
+    JobKind.EXPORT_TICKETS.value: export_tickets,
+    JobKind.IMPORT_TICKETS.value: import_tickets,
+    JobKind.BULK_UPDATE_TICKETS.value: bulk_update_tickets,
+    JobKind.RECOUNT_COMMENTS.value: recount_comments,
+    JobKind.ARCHIVE_CLOSED_TICKETS.value: archive_closed_tickets,
+    JobKind.REBUILD_ACTIVITY_ROLLUP.value: rebuild_activity_rollup,
+}
+
+
+class JobService:
+    """Submit, track and cancel background jobs.
+
+    At most `max_workers` jobs run concurrently and at most `max_pending`
+    more may wait; further submissions raise `JobQueueFull` so callers can
+    shed load instead of queuing without bound.
+    """
+    def __init__(self, repo: Optional[object] = None, ticket_service: Optional[TicketService] = None,
+                 max_workers: Optional[int] = None, max_pending: Optional[int] = None, lease: Optional[float] = None):
+        self.repo = repo or InMemoryJobRepo()
+        self.ticket_service = ticket_service
+        self.max_workers = max_workers or settings.JOB_WORKERS
+        self.max_pending = settings.JOB_MAX_PENDING if max_pending is None else max_pending
+        self.lease = settings.JOB_LEASE_SECONDS if lease is None else lease
+        # Unique per process start, so a restarted worker does not inherit its old jobs
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._active: Dict[int, Future] = {}
+        self._cancel_events: Dict[int, Event] = {}
+        self._lock = Lock()
+        self._stopped = Event()
+        self._heartbeat: Optional[Thread] = None
+        if hasattr(self.repo, "heartbeat"):
+            self._heartbeat = Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def submit_job(self, kind: str, params: Optional[Dict] = None) -> Dict:
+        """Persist a pending job and queue it; return the stored job."""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        with self._lock:
+            if len(self._active) >= self.max_workers + self.max_pending:
+                raise JobQueueFull("Too many background jobs in progress")
+            job = self.repo.save({"kind": kind, "status": JobStatus.PENDING, "params": params or {}, "owner": self.owner})
+            cancel_event = Event()
+            self._cancel_events[job["id"]] = cancel_event
+            self._active[job["id"]] = self._executor.submit(self._run, job["id"], kind, params or {}, cancel_event)
+        return job
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        return self.repo.get(job_id)
+
+    def cancel_job(self, job_id: int) -> Optional[Dict]:
+        """Request cancellation; return the job record or None if unknown.
+
+        A job this process does not run is marked cancelled in the repo;
+        the worker running it stops at its next checkpoint.
+        """
+        with self._lock:
+            future = self._active.get(job_id)
+            cancel_event = self._cancel_events.get(job_id)
+        if cancel_event is not None:
+            cancel_event.set()
+        if future is not None and future.cancel():
+            self._forget(job_id)
+            return self.repo.update(job_id, status=JobStatus.CANCELLED)
+        job = self.repo.get(job_id)
+        if cancel_event is None and job and job["status"] in (JobStatus.PENDING, JobStatus.RUNNING):
+            return self.repo.update(job_id, status=JobStatus.CANCELLED)
+        return job
+
+    def shutdown(self) -> None:
+        """Cancel queued and running jobs and stop the worker pool."""
+        self._stopped.set()
+        with self._lock:
+            events = list(self._cancel_events.values())
+        for event in events:
+            event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _heartbeat_loop(self) -> None:
+        """Renew this worker's job leases and fail jobs of workers whose lease lapsed."""
+        while True:
+            try:
+                self.repo.heartbeat(self.owner)
+                stale_before = datetime.now(timezone.utc) - timedelta(seconds=self.lease)
+                self.repo.fail_unfinished("Interrupted: the worker running it stopped", stale_before=stale_before)
+            except Exception:
+                logger.exception("Job heartbeat failed")
+            if self._stopped.wait(self.lease / 3):
+                return
+
+    def _forget(self, job_id: int) -> None:
+        with self._lock:
+            self._active.pop(job_id, None)
+            self._cancel_events.pop(job_id, None)
+
+    def _run(self, job_id: int, kind: str, params: Dict, cancel_event: Event) -> None:
+        ctx = JobContext(job_id, self.repo, cancel_event)
+        try:
+            ctx.check_cancelled()
+            self.repo.update(job_id, status=JobStatus.RUNNING)
+            result = JOB_HANDLERS[kind](ctx, self.ticket_service or get_ticket_service(), params)
+            self.repo.update(job_id, status=JobStatus.SUCCEEDED, progress=ctx.progress, result=result)
+        except JobCancelled:
+            self.repo.update(job_id, status=JobStatus.CANCELLED, progress=ctx.progress)
+        except Exception as e:
+            self.repo.update(job_id, status=JobStatus.FAILED, progress=ctx.progress, error=str(e))
+        finally:
+            self._forget(job_id)
+
+
+# FastAPI dependency provider
+_job_service_singleton: Optional[JobService] = None
+def get_job_service() -> JobService:
+    global _job_service_singleton
+    if _job_service_singleton is None:
+        _job_service_singleton = JobService()
+    return _job_service_singleton
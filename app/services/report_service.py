@@ -0,0 +1,114 @@
+"""Activity report service.
+
+Backs `GET /reports/activity`: tickets created, tickets closed and
+comments posted per hour or day. Counts are kept in an hourly rollup that
+writers bump as they go (the `activity_rollup` table in DB mode, bumped in
+the writing transaction; `InMemoryActivityRollup` otherwise), so a report
+reads at most one row per metric and hour and never scans tickets or
+comments. Daily figures are summed from the hourly rows.
+
+`rebuild_rollup` recomputes the rollup from the raw tables, to backfill
+history written before the rollup existed. When the in-memory stores are
+journaled, the in-memory rollup is journaled with them.
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.journal import Journal
+from app.core.utils import hour_bucket
+from app.models.report import ACTIVITY_METRICS, ReportGranularity
+
+
+class InMemoryActivityRollup:
+    """Hourly activity counters for the in-memory stores."""
+    def __init__(self):
+        self._counts: Counter = Counter()
+        self._lock = Lock()
+        self.journal: Optional[Journal] = None
+        # Journaled copy of `_counts`, keyed "<bucket iso>|<metric>"
+        self._persisted: Dict[str, int] = {}
+
+    def attach(self, journal: Journal) -> None:
+        """Persist the counters in `journal` alongside the stores they count."""
+        self.journal = journal
+        journal.attach("activity", self._persisted, on_load=self._after_load)
+
+    def _after_load(self) -> None:
+        with self._lock:
+            for key, n in self._persisted.items():
+                bucket, metric = key.split("|", 1)
+                self._counts[(datetime.fromisoformat(bucket), metric)] = n
+
+    def bump(self, metric: str, at, amount: int = 1) -> None:
+        bucket = hour_bucket(at or datetime.now(timezone.utc))
+        with self._lock:
+            self._counts[(bucket, metric)] += amount
+            if self.journal is not None:
+                key = f"{bucket.isoformat()}|{metric}"
+                self._persisted[key] = self._counts[(bucket, metric)]
+                self.journal.put("activity", key, self._persisted[key])
+
+    def hourly_counts(self, since: datetime) -> List[Dict]:
+        since = hour_bucket(since)
+        with self._lock:
+            rows = [{"bucket_start": bucket, "metric": metric, "count": n}
+                    for (bucket, metric), n in self._counts.items() if bucket >= since]
+        return sorted(rows, key=lambda r: (r["bucket_start"], r["metric"]))
+
+
+class ReportService:
+    """Serve activity reports from a DB `ActivityRepo` or an in-memory rollup."""
+    def __init__(self, repo: Optional[object] = None, rollup: Optional[InMemoryActivityRollup] = None):
+        self.repo = repo
+        self.rollup = rollup or get_activity_rollup()
+
+    def activity(self, granularity: str = ReportGranularity.DAY, days: Optional[int] = None) -> Dict:
+        """Return activity counts per `granularity` bucket over the last `days` days.
+
+        Only buckets with activity are listed, oldest first; each carries a
+        count for every metric in `ACTIVITY_METRICS`.
+        """
+        since = hour_bucket(datetime.now(timezone.utc) - timedelta(days=days or settings.REPORT_MAX_DAYS))
+        if granularity == ReportGranularity.DAY:
+            since = since.replace(hour=0)
+        rows = (self.repo or self.rollup).hourly_counts(since)
+        buckets: Dict[datetime, Dict] = {}
+        for row in rows:
+            start = row["bucket_start"]
+            if granularity == ReportGranularity.DAY:
+                start = start.replace(hour=0)
+            bucket = buckets.setdefault(start, {"start": start, **{m: 0 for m in ACTIVITY_METRICS}})
+            bucket[row["metric"]] = bucket.get(row["metric"], 0) + row["count"]
+        return {"granularity": ReportGranularity(granularity).value, "since": since, "buckets": list(buckets.values())}
+
+    def rebuild_rollup(self, days: Optional[int] = None) -> int:
+        """Recompute the last `days` days of the DB rollup from the raw tables.
+
+        The in-memory rollup is bumped by every write (and journaled with
+        the stores when they persist), so there is nothing to rebuild.
+        Returns the number of rollup rows written.
+        """
+        if not self.repo:
+            return 0
+        return self.repo.rebuild(datetime.now(timezone.utc) - timedelta(days=days or settings.REPORT_MAX_DAYS))
+
+
+# Shared in-memory rollup bumped by the in-memory ticket/comment stores
+_activity_rollup_singleton: Optional[InMemoryActivityRollup] = None
+def get_activity_rollup() -> InMemoryActivityRollup:
+    global _activity_rollup_singleton
+    if _activity_rollup_singleton is None:
+        _activity_rollup_singleton = InMemoryActivityRollup()
+    return _activity_rollup_singleton
+
+
+# FastAPI dependency provider
+_report_service_singleton: Optional[ReportService] = None
+def get_report_service() -> ReportService:
+    global _report_service_singleton
+    if _report_service_singleton is None:
+        _report_service_singleton = ReportService()
+    return _report_service_singleton
@@ -0,0 +1,111 @@
+"""Incremental sync service.
+
+Backs `GET /sync?since=<seq>&limit=`: clients remember the last sequence
+number they saw and fetch only what changed after it. Every ticket and
+comment insert, update and delete is recorded under a monotonically
+increasing sequence; deletes are kept as tombstones so clients can drop
+local copies.
+
+With a DB repo the log lives in the `change_log` table and is written in
+the same transaction as the change (see `app.db.repositories`). In
+in-memory mode `InMemoryChangeLog` keeps the latest change per entity,
+with a snapshot of the record, in sequence order. When the stores are
+journaled, the change log is journaled with them, so sequence numbers
+keep increasing across restarts and clients' `since` stays valid.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional
+from app.core.journal import Journal
+
+
+class InMemoryChangeLog:
+    """Latest change per (entity, id), ordered by a monotonic sequence."""
+    def __init__(self):
+        # Keyed by "entity:id" so the journal can persist it as a plain store
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._seq = 0
+        self._lock = Lock()
+        self.journal: Optional[Journal] = None
+
+    def attach(self, journal: Journal) -> None:
+        """Persist the log in `journal` alongside the stores it describes."""
+        self.journal = journal
+        journal.attach("changes", self._entries, on_load=self._after_load)
+
+    def _after_load(self) -> None:
+        # Replay overwrites keys in place, so restore sequence order explicitly
+        with self._lock:
+            entries = sorted(self._entries.items(), key=lambda item: item[1]["seq"])
+            self._entries.clear()
+            self._entries.update(entries)
+            self._seq = max(self._seq, entries[-1][1]["seq"] if entries else 0)
+
+    def record(self, entity: str, entity_id: int, data: Optional[Dict] = None, op: str = "upsert") -> int:
+        """Record a change and return its sequence number.
+
+        `data` is snapshotted for upserts; deletes store a tombstone.
+        """
+        with self._lock:
+            self._seq += 1
+            key = f"{entity}:{entity_id}"
+            self._entries.pop(key, None)
+            self._entries[key] = entry = {
+                "seq": self._seq, "entity": entity, "id": entity_id, "op": op,
+                "data": dict(data) if data is not None and op != "delete" else None,
+            }
+            if self.journal is not None:
+                # Under the lock, so the log holds a key's changes in sequence order
+                self.journal.put("changes", key, entry)
+            return self._seq
+
+    def changes_since(self, since: int, limit: int) -> Dict:
+        """Return up to `limit` changes with `seq > since`, in sequence order.
+
+        Walks back from the newest entry, so cost follows the number of
+        changes after `since` rather than the size of the store.
+        """
+        with self._lock:
+            newer = []
+            for entry in reversed(self._entries.values()):
+                if entry["seq"] <= since:
+                    break
+                newer.append(entry)
+        newer.reverse()
+        changes = newer[:limit]
+        return {
+            "changes": changes,
+            "next_since": changes[-1]["seq"] if changes else since,
+            "has_more": len(newer) > limit,
+        }
+
+
+class SyncService:
+    """Serve incremental changes from a DB `ChangeRepo` or an in-memory log."""
+    def __init__(self, repo: Optional[object] = None, change_log: Optional[InMemoryChangeLog] = None):
+        self.repo = repo
+        self.change_log = change_log or get_change_log()
+
+    def changes_since(self, since: int = 0, limit: int = 100) -> Dict:
+        if self.repo:
+            return self.repo.changes_since(since, limit)
+        return self.change_log.changes_since(since, limit)
+
+
+# Shared in-memory change log written by the in-memory ticket/comment stores
+_change_log_singleton: Optional[InMemoryChangeLog] = None
+def get_change_log() -> InMemoryChangeLog:
+    global _change_log_singleton
+    if _change_log_singleton is None:
+        _change_log_singleton = InMemoryChangeLog()
+    return _change_log_singleton
+
+
+# FastAPI dependency provider
+_sync_service_singleton: Optional[SyncService] = None
+def get_sync_service() -> SyncService:
+    global _sync_service_singleton
+    if _sync_service_singleton is None:
+        _sync_service_singleton = SyncService()
+    return _sync_service_singleton
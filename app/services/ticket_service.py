@@ -11,12 +11,34 @@ When provided, comments are attached to ticket responses using the
 separated and avoids direct access to another service's internals.
 """
 
-from typing import Dict, Optional
+import asyncio
+import heapq
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional, Sequence
+from app.core.config import settings
+from app.core.journal import Journal
+from app.core.singleflight import SingleFlight
 from app.core.utils import now_iso
-from app.models.ticket import TicketCreate
-from app.services.comment_service import CommentService
+from app.models.ticket import CLAIM_PRIORITY_ORDER, Status, TicketCreate
+from app.services.comment_service import CommentService, get_comment_service
+from app.services.event_bus import EventBus, get_event_bus
+from app.services.report_service import InMemoryActivityRollup, get_activity_rollup
+from app.services.sync_service import InMemoryChangeLog, get_change_log
 from threading import Lock
 
+def _project(item: Dict, fields: Optional[Sequence[str]]) -> Dict:
+    """Return only `id` plus the requested `fields` of `item` (all of it if None)."""
+    if not fields:
+        return item
+    return {k: item[k] for k in ("id", *fields) if k in item}
+
+_CLAIM_RANK = {p.value: rank for rank, p in enumerate(CLAIM_PRIORITY_ORDER)}
+
+def _claim_key(ticket: Dict):
+    """Heap key for `claim_next`: priority rank, then age."""
+    priority = getattr(ticket.get("priority"), "value", ticket.get("priority"))
+    return (_CLAIM_RANK.get(priority, len(_CLAIM_RANK)), ticket.get("created_at") or "", ticket["id"])
+
 class InMemoryRepo:
     """A simple thread-safe in-memory repository used for tests.
 
@@ -24,11 +46,62 @@ class InMemoryRepo:
     interface expected by the `TicketService`. It uses a `threading.Lock`
     to prevent race conditions when running under multiple threads in
     the same process (but does not address multi-process concurrency).
+
+    Every write is recorded in `change_log` (the shared in-memory log by
+    default) for the incremental sync endpoint, and creations and closures
+    are counted in `rollup` for activity reports.
+
+    Writes to an archived ticket move it back to the hot store first, as
+    `TicketRepo` does.
+
+    Open tickets are also kept in a heap ordered by `_claim_key` for
+    `claim_next`. Entries are pushed whenever a ticket becomes open or
+    changes priority and are never removed in place; stale ones are
+    discarded when they reach the top.
     """
-    def __init__(self):
+    def __init__(self, change_log: Optional[InMemoryChangeLog] = None, rollup: Optional[InMemoryActivityRollup] = None,
+                 journal: Optional[Journal] = None):
         self._store: Dict[int, Dict] = {}
+        # Closed tickets moved out of `_store` by `archive_closed`
+        self._archive: Dict[int, Dict] = {}
         self._next = 1
         self._lock = Lock()
+        self._open_heap: list = []
+        self.change_log = change_log or get_change_log()
+        self.rollup = rollup or get_activity_rollup()
+        # Optional on-disk persistence; `journal.load()` restores both stores
+        self.journal = journal
+        if journal is not None:
+            journal.attach("tickets", self._store, on_load=self._after_load)
+            journal.attach("tickets_archive", self._archive)
+
+    def _after_load(self) -> None:
+        self._next = max([*self._store, *self._archive], default=0) + 1
+        for ticket in self._store.values():
+            self._push_if_open(ticket)
+
+    def _record(self, ticket_id: int, ticket: Optional[Dict] = None, op: str = "upsert") -> None:
+        """Record a write in the change log and, if configured, the journal."""
+        self.change_log.record("ticket", ticket_id, ticket, op=op)
+        if self.journal is not None:
+            if op == "delete":
+                self.journal.delete("tickets", ticket_id)
+            else:
+                self.journal.put("tickets", ticket_id, ticket)
+
+    def _for_write(self, ticket_id: int) -> Optional[Dict]:
+        """Return a ticket to modify, unarchiving it if needed; call with `_lock` held."""
+        ticket = self._store.get(ticket_id)
+        if ticket is None and ticket_id in self._archive:
+            ticket = self._store[ticket_id] = self._archive.pop(ticket_id)
+            if self.journal is not None:
+                self.journal.delete("tickets_archive", ticket_id)
+                self.journal.put("tickets", ticket_id, ticket)
+        return ticket
+
+    def _push_if_open(self, ticket: Dict) -> None:
+        if ticket.get("status") == Status.OPEN:
+            heapq.heappush(self._open_heap, _claim_key(ticket))
 
     def save(self, data: Dict) -> Dict:
         """Persist `data` in memory and return it with an `id` assigned."""
@@ -36,21 +109,86 @@ class InMemoryRepo:
             tid = self._next
             self._next += 1
             data = dict(data, id=tid)
+            data.setdefault("comment_count", 0)
+            data.setdefault("last_activity_at", data.get("created_at"))
+            data.setdefault("closed_at", data.get("created_at") if data.get("status") == Status.CLOSED else None)
+            data.setdefault("assignee", None)
             self._store[tid] = data
+            self._push_if_open(data)
+            self._record(tid, data)
+            self.rollup.bump("created", data.get("created_at"))
+            if data["closed_at"]:
+                self.rollup.bump("closed", data["closed_at"])
             return data
 
-    def get(self, tid: int) -> Optional[Dict]:
-        """Return stored item by id or None."""
-        return self._store.get(tid)
+    def get(self, tid: int, fields: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        """Return stored item by id (projected to `fields`), checking the archive too, or None."""
+        with self._lock:
+            item = self._store.get(tid) or self._archive.get(tid)
+            return _project(item, fields) if item else None
+
+    def get_many(self, ids: Sequence[int], fields: Optional[Sequence[str]] = None) -> Dict[int, Dict]:
+        """Return the stored items for `ids` keyed by id; missing ids are omitted."""
+        found = {}
+        for tid in ids:
+            item = self.get(tid, fields)
+            if item:
+                found[tid] = item
+        return found
+
+    def archive_closed(self, closed_before: datetime, batch_size: int) -> int:
+        """Move up to `batch_size` tickets closed before `closed_before` to the archive.
 
-    def list(self):
-        """Return a list of all stored items."""
-        return list(self._store.values())
+        Comments live in the comment service's store and are left in place.
+        """
+        with self._lock:
+            ids = [tid for tid, t in self._store.items()
+                   if t.get("status") == Status.CLOSED and t.get("closed_at")
+                   and datetime.fromisoformat(str(t["closed_at"]).replace("Z", "+00:00")) < closed_before][:batch_size]
+            for tid in ids:
+                self._archive[tid] = self._store.pop(tid)
+                if self.journal is not None:
+                    self.journal.delete("tickets", tid)
+                    self.journal.put("tickets_archive", tid, self._archive[tid])
+            return len(ids)
+
+    def list(self, sort: Optional[str] = None, fields: Optional[Sequence[str]] = None):
+        """Return a list of all stored items; `sort="recent"` orders by last activity, `sort="created"` by creation."""
+        with self._lock:
+            items = list(self._store.values())
+        if sort == "recent":
+            items.sort(key=lambda t: (t.get("last_activity_at") or "", t["id"]), reverse=True)
+        elif sort == "created":
+            items.sort(key=lambda t: (t.get("created_at") or "", t["id"]))
+        return [_project(t, fields) for t in items]
+
+    def record_comment_activity(self, ticket_id: int, delta: int, at: Optional[str] = None) -> Optional[Dict]:
+        """Adjust the denormalized `comment_count` and `last_activity_at` of a ticket."""
+        with self._lock:
+            ticket = self._for_write(ticket_id)
+            if not ticket:
+                return None
+            ticket["comment_count"] = max(0, ticket.get("comment_count", 0) + delta)
+            if at is not None:
+                ticket["last_activity_at"] = at
+            self._record(ticket_id, ticket)
+            return ticket
+
+    def set_comment_stats(self, ticket_id: int, comment_count: int, last_activity_at: Optional[str] = None) -> Optional[Dict]:
+        """Overwrite the denormalized comment counters, e.g. after a recount."""
+        with self._lock:
+            ticket = self._for_write(ticket_id)
+            if not ticket:
+                return None
+            ticket["comment_count"] = comment_count
+            ticket["last_activity_at"] = last_activity_at or ticket.get("created_at")
+            self._record(ticket_id, ticket)
+            return ticket
 
     def update_title_description(self, ticket_id: int, new_title: Optional[str], new_description: Optional[str]) -> Optional[Dict]:
         """Update title and/or description for an in-memory ticket."""
         with self._lock:
-            ticket = self._store.get(ticket_id)
+            ticket = self._for_write(ticket_id)
             if not ticket:
                 return None
             if new_title is not None:
@@ -58,32 +196,59 @@ class InMemoryRepo:
             if new_description is not None:
                 ticket["description"] = new_description
             self._store[ticket_id] = ticket
+            self._record(ticket_id, ticket)
             return ticket
 
     def update_status(self, ticket_id: int, new_status: str) -> Optional[Dict]:
         """Update the status field of an in-memory ticket."""
         with self._lock:
-            ticket = self._store.get(ticket_id)
+            ticket = self._for_write(ticket_id)
             if not ticket:
                 return None
+            was_closed = ticket.get("status") == Status.CLOSED
             ticket["status"] = new_status
+            ticket["closed_at"] = (ticket.get("closed_at") or now_iso()) if new_status == Status.CLOSED else None
             self._store[ticket_id] = ticket
+            self._push_if_open(ticket)
+            self._record(ticket_id, ticket)
+            if new_status == Status.CLOSED and not was_closed:
+                self.rollup.bump("closed", ticket["closed_at"])
             return ticket
 
     def update_priority(self, ticket_id: int, new_priority: str) -> Optional[Dict]:
         """Update the priority field of an in-memory ticket."""
         with self._lock:
-            ticket = self._store.get(ticket_id)
+            ticket = self._for_write(ticket_id)
             if not ticket:
                 return None
             ticket["priority"] = new_priority
             self._store[ticket_id] = ticket
+            self._push_if_open(ticket)
+            self._record(ticket_id, ticket)
             return ticket
 
+    def claim_next(self, assignee: str) -> Optional[Dict]:
+        """Pop the highest-priority, oldest open ticket, mark it in progress and assign it."""
+        with self._lock:
+            while self._open_heap:
+                key = heapq.heappop(self._open_heap)
+                ticket = self._store.get(key[-1])
+                if not ticket or ticket.get("status") != Status.OPEN or _claim_key(ticket) != key:
+                    continue
+                ticket["status"] = Status.IN_PROGRESS
+                ticket["assignee"] = assignee
+                self._record(ticket["id"], ticket)
+                return ticket
+            return None
+
     def delete(self, ticket_id: int) -> Optional[Dict]:
         """Delete a ticket from the in-memory store and return it, or None."""
         with self._lock:
-            return self._store.pop(ticket_id, None)
+            ticket = self._for_write(ticket_id)
+            if ticket:
+                del self._store[ticket_id]
+                self._record(ticket_id, op="delete")
+            return ticket
 
 class TicketService:
     """Service for managing tickets.
@@ -99,47 +264,170 @@ class TicketService:
     The `repo` should implement `save`, `get`, and `list`. The class
     intentionally delegates comment retrieval to a provided
     `comment_service` to avoid accessing another service's internals.
+
+    Every successful write is published to `event_bus` (the shared bus by
+    default) as a `ticket.created/updated/deleted` event.
+
+    `get_ticket_coalesced` / `list_tickets_coalesced` are the async read
+    paths used by the API: identical concurrent reads share one backend
+    call, and any ticket or comment event on the bus stops later readers
+    from joining calls that started before it. DB reads run off the event
+    loop; in-memory reads run inline, so they never iterate the stores
+    while a write on the loop changes them.
     """
-    def __init__(self, repo: Optional[InMemoryRepo] = None, comment_service: Optional[CommentService] = None):
+    def __init__(self, repo: Optional[InMemoryRepo] = None, comment_service: Optional[CommentService] = None, event_bus: Optional[EventBus] = None):
         self.repo = repo or InMemoryRepo()
+        self.events = event_bus or get_event_bus()
+        self._flights = SingleFlight()
+        self._offload_reads = not isinstance(self.repo, InMemoryRepo)
+        self.events.add_listener(self._on_change)
         # Comment service provides `list_comments_for_ticket`; may be a DB-backed service or in-memory
         self.comment_service = comment_service
+        # An in-memory comment service has no DB transaction to maintain ticket counters,
+        # so let it report comment activity to this service's repo instead.
+        if comment_service is not None and comment_service.repo is None and comment_service.ticket_repo is None:
+            comment_service.ticket_repo = self.repo
 
     def create_ticket(self, ticket: TicketCreate) -> Dict:
         """Create and persist a ticket, returning its representation."""
         data = {"title": ticket.title, "description": ticket.description, "created_at": now_iso(), "status": ticket.status, "priority": ticket.priority}
-        return self.repo.save(data)
+        return self._publish("ticket.created", self.repo.save(data))
 
-    def get_ticket(self, ticket_id: int):
-        """Return a ticket dict including `comments` list (empty if none)."""
-        comments = self.comment_service.list_comments_for_ticket(ticket_id) if self.comment_service else []
-        ticket = self.repo.get(ticket_id)
-        return {**ticket, "comments": comments} if ticket else {}
+    def _publish(self, event_type: str, ticket: Optional[Dict]) -> Optional[Dict]:
+        """Publish `ticket` to the event bus if the write succeeded, and return it."""
+        if ticket:
+            self.events.publish(event_type, ticket)
+        return ticket
+
+    def _on_change(self, event: Dict) -> None:
+        self._flights.forget_all()
+
+    async def get_ticket_coalesced(self, ticket_id: int, fields: Optional[Sequence[str]] = None, include_comments: bool = True):
+        """`get_ticket`, shared between identical concurrent callers."""
+        key = ("get", ticket_id, tuple(fields) if fields else None, include_comments)
+        return await self._flights.do(key, lambda: self._read(self.get_ticket, ticket_id, fields, include_comments))
+
+    async def list_tickets_coalesced(self, include_comments: bool = True, sort: Optional[str] = None, fields: Optional[Sequence[str]] = None):
+        """`list_tickets`, shared between identical concurrent callers."""
+        key = ("list", include_comments, sort, tuple(fields) if fields else None)
+        return await self._flights.do(key, lambda: self._read(self.list_tickets, include_comments, sort, fields))
+
+    async def _read(self, fn, *args):
+        """Run a read off the event loop when it goes to the DB, inline otherwise."""
+        if self._offload_reads:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def get_ticket(self, ticket_id: int, fields: Optional[Sequence[str]] = None, include_comments: bool = True):
+        """Return a ticket dict, or {} if missing.
+
+        `fields` limits the returned columns (the repo selects only those).
+        When `include_comments` is set, the latest `TICKET_EMBEDDED_COMMENTS`
+        comments are attached newest first, with `comments_next_cursor` for
+        fetching older ones from `list_ticket_comments`; otherwise the
+        comment query is skipped.
+        """
+        ticket = self.repo.get(ticket_id, fields=fields)
+        if not ticket:
+            return {}
+        if not include_comments:
+            return ticket
+        if not self.comment_service:
+            return {**ticket, "comments": [], "comments_next_cursor": None}
+        page = self.comment_service.list_comments_page(ticket_id, limit=settings.TICKET_EMBEDDED_COMMENTS)
+        return {**ticket, "comments": page["comments"], "comments_next_cursor": page["next_cursor"]}
+
+    def list_ticket_comments(self, ticket_id: int, limit: Optional[int] = None, cursor: Optional[str] = None) -> Optional[Dict]:
+        """Return a page of a ticket's comments (see `CommentService.list_comments_page`).
+
+        Returns None if the ticket does not exist; existence is only checked
+        when the first page comes back empty.
+        """
+        page = self.comment_service.list_comments_page(ticket_id, limit=limit, cursor=cursor) if self.comment_service else {"comments": [], "next_cursor": None}
+        if not page["comments"] and cursor is None and not self.repo.get(ticket_id, fields=("id",)):
+            return None
+        return page
     
+    def get_tickets(self, ids: Sequence[int], fields: Optional[Sequence[str]] = None, include_comments: bool = False) -> Dict:
+        """Resolve several tickets at once.
+
+        Uses one repo `get_many` call and, when `include_comments` is set,
+        one batched comment lookup. Returns `{"found": {id: ticket}, "missing": [ids]}`.
+        """
+        ids = list(dict.fromkeys(ids))
+        found = self.repo.get_many(ids, fields=fields)
+        if include_comments and found:
+            comments = self.comment_service.list_comments_for_tickets(list(found)) if self.comment_service else {}
+            found = {tid: {**ticket, "comments": comments.get(tid, [])} for tid, ticket in found.items()}
+        return {"found": found, "missing": [tid for tid in ids if tid not in found]}
+
     def update_ticket_status(self, ticket_id: int, new_status: str):
         """Update ticket status via repository; return updated record or None."""
-        return self.repo.update_status(ticket_id, new_status)
+        return self._publish("ticket.updated", self.repo.update_status(ticket_id, new_status))
     
+    def claim_next_ticket(self, assignee: str) -> Optional[Dict]:
+        """Assign the highest-priority, oldest open ticket to `assignee` and mark it in progress.
+
+        Returns the claimed ticket, or None when no ticket is open.
+        """
+        return self._publish("ticket.updated", self.repo.claim_next(assignee))
+
     def update_ticket_priority(self, ticket_id: int, new_priority: str):
         """Update ticket priority via repository; return updated record or None."""
-        return self.repo.update_priority(ticket_id, new_priority)
+        return self._publish("ticket.updated", self.repo.update_priority(ticket_id, new_priority))
 
     def update_ticket_title(self, ticket_id: int, new_title: str):
         """Update ticket title and return updated record or None."""
-        return self.repo.update_title_description(ticket_id, new_title, None)
+        return self._publish("ticket.updated", self.repo.update_title_description(ticket_id, new_title, None))
 
     def update_ticket_description(self, ticket_id: int, new_description: str):
         """Update ticket description and return updated record or None."""
-        return self.repo.update_title_description(ticket_id, None, new_description)
+        return self._publish("ticket.updated", self.repo.update_title_description(ticket_id, None, new_description))
+
+    def recount_comments(self, ticket_id: int):
+        """Recompute `comment_count`/`last_activity_at` from the comment service."""
+        comments = self.comment_service.list_comments_for_ticket(ticket_id) if self.comment_service else []
+        last = max((c["created_at"] for c in comments), default=None)
+        return self._publish("ticket.updated", self.repo.set_comment_stats(ticket_id, len(comments), last))
+
+    def archive_closed_tickets(self, older_than_days: Optional[float] = None, batch_size: Optional[int] = None,
+                               on_batch: Optional[Callable[[int], None]] = None) -> int:
+        """Move tickets closed longer than `older_than_days` to the archive, in batches.
+
+        Keeps the hot ticket table (and every list/index scan over it) bounded
+        as history grows; archived tickets stay readable via `get_ticket`.
+        `on_batch` is called with each batch's size, and may raise to stop
+        between batches. Returns the number of tickets moved.
+        """
+        days = settings.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+        closed_before = datetime.now(timezone.utc) - timedelta(days=days)
+        moved = 0
+        while True:
+            batch = self.repo.archive_closed(closed_before, batch_size or settings.ARCHIVE_BATCH_SIZE)
+            if not batch:
+                return moved
+            moved += batch
+            self._flights.forget_all()
+            if on_batch:
+                on_batch(batch)
 
     def delete_ticket(self, ticket_id: int):
         """Delete a ticket and return the deleted record or None."""
-        return self.repo.delete(ticket_id)
+        return self._publish("ticket.deleted", self.repo.delete(ticket_id))
     
-    def list_tickets(self):
-        """List tickets and attach associated comments for each."""
-        tickets = []    
-        for ticket in self.repo.list():
+    def list_tickets(self, include_comments: bool = True, sort: Optional[str] = None, fields: Optional[Sequence[str]] = None):
+        """List tickets, optionally attaching associated comments for each.
+
+        `comment_count` and `last_activity_at` are available as columns, so
+        callers that only need a summary can pass `include_comments=False`
+        and avoid loading comment bodies entirely. `fields` is passed to the
+        repo to limit the selected columns.
+        """
+        tickets = []
+        for ticket in self.repo.list(sort=sort, fields=fields):
+            if not include_comments:
+                tickets.append(ticket)
+                continue
             comments = self.comment_service.list_comments_for_ticket(ticket.get("id")) if self.comment_service else []
             tickets.append({**ticket, "comments": comments})
         return tickets
@@ -150,5 +438,5 @@ _ticket_service_singleton: Optional[TicketService] = None
 def get_ticket_service() -> TicketService:
     global _ticket_service_singleton
     if _ticket_service_singleton is None:
-        _ticket_service_singleton = TicketService()
+        _ticket_service_singleton = TicketService(comment_service=get_comment_service())
     return _ticket_service_singleton
@@ -4,9 +4,22 @@ Provides a thin service layer for user management. Supports an in-
 memory fallback for tests/demos and a repo-backed mode when a DB repo
 is available. Public API is synchronous except where async is kept for
 compatibility with potential async repo implementations.
+
+In repo mode, lookups go through a bounded in-process `TTLCache` keyed
+by lowercased email. Found users are cached for `USER_CACHE_TTL`
+seconds and unknown emails for the shorter `USER_CACHE_NEGATIVE_TTL`, so
+repeated misses do not reach the DB either. Writes through this service
+invalidate their entry. Writes by other processes (e.g. other uvicorn
+workers) bump the "users" row of the `cache_versions` table; at most every
+`USER_CACHE_VERSION_CHECK_MS` a lookup compares it with the version last
+seen and clears the cache if it moved.
 """
 
+import time
 from typing import Dict, Optional
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.journal import Journal
 from app.models.user import UserCreate
 
 
@@ -18,17 +31,46 @@ class UserService:
     `get_by_email`, `get`, and `list`). When no repo is provided the
     service uses an in-memory dict keyed by email (lowercased).
     """
-    def __init__(self, repo: Optional[object] = None):
+    def __init__(self, repo: Optional[object] = None, cache: Optional[TTLCache] = None, journal: Optional[Journal] = None):
         self.repo = repo
         if self.repo is None:
             self._store: Dict[str, Dict] = {}
+            # Optional on-disk persistence of the in-memory store
+            self.journal = journal
+            if journal is not None:
+                journal.attach("users", self._store)
+        self.cache = cache or TTLCache(settings.USER_CACHE_SIZE)
+        self._cache_version: Optional[int] = None
+        self._version_checked_at = float("-inf")
+
+    def _sync_cache(self) -> None:
+        """Clear the cache if another process has written users since the last check."""
+        if not hasattr(self.repo, "cache_version"):
+            return
+        now = time.monotonic()
+        if now - self._version_checked_at < settings.USER_CACHE_VERSION_CHECK_MS / 1000:
+            return
+        self._version_checked_at = now
+        version = self.repo.cache_version()
+        if version != self._cache_version:
+            self.cache.clear()
+            self._cache_version = version
+
+    def _cache_put(self, email: str, user: Optional[Dict]) -> None:
+        ttl = settings.USER_CACHE_TTL if user is not None else settings.USER_CACHE_NEGATIVE_TTL
+        self.cache.set(email, user, ttl)
 
     def create_user(self, user: UserCreate) -> Dict:
         """Create a user and return its stored representation."""
         data = {"email": user.email.lower(), "role": user.role}
         if self.repo:
-            return self.repo.save(data)
+            try:
+                return self.repo.save(data)
+            finally:
+                self.cache.invalidate(data["email"])
         self._store[data["email"]] = data
+        if self.journal is not None:
+            self.journal.put("users", data["email"], data)
         return data
 
     async def get_user(self, user_email: str):
@@ -37,9 +79,41 @@ class UserService:
         The method adapts to the configured storage (repo or in-memory).
         """
         if self.repo:
-            return self.repo.get_by_email(user_email)
+            self._sync_cache()
+            key = user_email.lower()
+            hit, user = self.cache.get(key)
+            if not hit:
+                user = self.repo.get_by_email(key)
+                self._cache_put(key, user)
+            return user
         return self._store.get(user_email)
 
+    async def get_users(self, user_emails) -> Dict:
+        """Resolve several users by email at once.
+
+        Returns `{"found": {email: user}, "missing": [emails]}`.
+        """
+        emails = list(dict.fromkeys(user_emails))
+        if self.repo:
+            self._sync_cache()
+            found, to_fetch = {}, []
+            for email in emails:
+                hit, user = self.cache.get(email.lower())
+                if not hit:
+                    to_fetch.append(email)
+                elif user is not None:
+                    found[email] = user
+            if to_fetch:
+                fetched = self.repo.get_many_by_email(to_fetch)
+                for email in to_fetch:
+                    user = fetched.get(email.lower())
+                    self._cache_put(email.lower(), user)
+                    if user is not None:
+                        found[email] = user
+        else:
+            found = {e: self._store[e] for e in emails if e in self._store}
+        return {"found": found, "missing": [e for e in emails if e not in found]}
+
     async def list_users(self):
         """Return a list of all users."""
         if self.repo:
@@ -53,18 +127,29 @@ class UserService:
         in-memory store and returns the modified dict.
         """
         if self.repo:
-            return self.repo.update_role(user_email, new_role)
+            try:
+                return self.repo.update_role(user_email, new_role)
+            finally:
+                self.cache.invalidate(user_email.lower())
         user = self._store.get(user_email)
         if not user:
             return None
         user["role"] = new_role
+        if self.journal is not None:
+            self.journal.put("users", user_email, user)
         return user
 
     async def delete_user(self, user_email: str):
         """Delete a user by email and return deleted record or None."""
         if self.repo:
-            return self.repo.delete_by_email(user_email)
-        return self._store.pop(user_email, None)
+            try:
+                return self.repo.delete_by_email(user_email)
+            finally:
+                self.cache.invalidate(user_email.lower())
+        user = self._store.pop(user_email, None)
+        if user and self.journal is not None:
+            self.journal.delete("users", user_email)
+        return user
     
 
 # FastAPI dependency provider
@@ -1,3 +1,34 @@
 import os
 
 os.environ.setdefault("SECRET_KEY", "testsecretkey")
+# Every test request shares one subject; limits are exercised explicitly instead
+os.environ.setdefault("RATE_LIMIT_PER_SECOND", "0")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Session factory bound to a throwaway SQLite file with the full schema."""
+    from app.db import models
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", future=True)
+    models.Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def restore_service_singletons(monkeypatch):
+    """Undo the service singletons an app lifespan run installs."""
+    import app.services.ticket_service as ticket_service_mod
+    import app.services.user_service as user_service_mod
+    import app.services.comment_service as comment_service_mod
+    import app.services.sync_service as sync_service_mod
+    import app.services.job_service as job_service_mod
+    import app.services.report_service as report_service_mod
+    for mod, name in [(ticket_service_mod, "_ticket_service_singleton"), (user_service_mod, "_user_service_singleton"),
+                      (comment_service_mod, "_comment_service_singleton"), (sync_service_mod, "_sync_service_singleton"),
+                      (job_service_mod, "_job_service_singleton"), (report_service_mod, "_report_service_singleton")]:
+        monkeypatch.setattr(mod, name, getattr(mod, name))
@@ -77,3 +77,785 @@ def test_user_service_flow():
 
     deleted = asyncio.run(user_svc.delete_user("john@example.com"))
     assert deleted and deleted["email"] == "john@example.com"
+
+def test_comment_activity_is_denormalized_on_ticket():
+    comment_svc = CommentService()
+    ticket_svc = TicketService(comment_service=comment_svc)
+    first = ticket_svc.create_ticket(TicketCreate(title="A", description="a"))
+    second = ticket_svc.create_ticket(TicketCreate(title="B", description="b"))
+    assert first["comment_count"] == 0
+
+    created = asyncio.run(comment_svc.create_comment(CommentCreate(ticket_id=first["id"], user_email="u@example.com", content="hi")))
+    asyncio.run(comment_svc.create_comment(CommentCreate(ticket_id=first["id"], user_email="u@example.com", content="again")))
+    summary = ticket_svc.list_tickets(include_comments=False, sort="recent")
+    assert [t["id"] for t in summary] == [first["id"], second["id"]]
+    assert "comments" not in summary[0]
+    assert summary[0]["comment_count"] == 2
+
+    comment_svc.delete_comment(created["id"])
+    assert ticket_svc.get_ticket(first["id"])["comment_count"] == 1
+    assert [t["id"] for t in ticket_svc.list_tickets(include_comments=False, sort="created")] == [first["id"], second["id"]]
+
+def test_comment_repo_maintains_ticket_counters(session_factory):
+    from app.db.repositories import CommentRepo, TicketRepo
+    comment_svc = CommentService(repo=CommentRepo(session_factory))
+    ticket_svc = TicketService(repo=TicketRepo(session_factory), comment_service=comment_svc)
+    first = ticket_svc.create_ticket(TicketCreate(title="A", description="a"))
+    second = ticket_svc.create_ticket(TicketCreate(title="B", description="b"))
+
+    created = asyncio.run(comment_svc.create_comment(CommentCreate(ticket_id=first["id"], user_email="u@example.com", content="hi")))
+    assert created["user_email"] == "u@example.com"
+    summary = ticket_svc.list_tickets(include_comments=False, sort="recent")
+    assert [t["id"] for t in summary] == [first["id"], second["id"]]
+    assert summary[0]["comment_count"] == 1
+
+    comment_svc.delete_comment(created["id"])
+    assert ticket_svc.get_ticket(first["id"])["comment_count"] == 0
+
+    asyncio.run(comment_svc.create_comment(CommentCreate(ticket_id=second["id"], user_email="u@example.com", content="hi")))
+    assert [t["id"] for t in ticket_svc.list_tickets(include_comments=False, sort="recent")] == [second["id"], first["id"]]
+    assert [t["id"] for t in ticket_svc.list_tickets(include_comments=False, sort="created")] == [first["id"], second["id"]]
+
+def test_comment_batching_groups_concurrent_creates(session_factory):
+    from app.db.repositories import ActivityRepo, ChangeRepo, CommentRepo, TicketRepo
+    from datetime import datetime, timedelta, timezone
+    comment_svc = CommentService(repo=CommentRepo(session_factory), batch_size=4, batch_wait=0.05)
+    ticket_svc = TicketService(repo=TicketRepo(session_factory), comment_service=comment_svc)
+    first = ticket_svc.create_ticket(TicketCreate(title="A", description="a"))
+    second = ticket_svc.create_ticket(TicketCreate(title="B", description="b"))
+
+    async def burst():
+        creates = [comment_svc.create_comment(CommentCreate(ticket_id=(first, second)[i % 2]["id"], user_email="u@example.com", content=f"c{i}"))
+                   for i in range(6)]
+        return await asyncio.gather(*creates)
+
+    created = asyncio.run(burst())
+    # One full batch of 4, then the remaining 2 after the wait
+    assert (comment_svc._batcher.batches, comment_svc._batcher.items) == (2, 6)
+    assert [c["content"] for c in created] == [f"c{i}" for i in range(6)]
+    assert len({c["id"] for c in created}) == 6
+    assert comment_svc.get_comment(created[5]["id"])["content"] == "c5"
+    assert ticket_svc.get_ticket(first["id"])["comment_count"] == 3
+    assert ticket_svc.get_ticket(second["id"])["comment_count"] == 3
+    assert {c["id"] for c in created} <= {c["id"] for c in ChangeRepo(session_factory).changes_since(0, 100)["changes"] if c["entity"] == "comment"}
+    hourly = ActivityRepo(session_factory).hourly_counts(datetime.now(timezone.utc) - timedelta(hours=1))
+    assert sum(r["count"] for r in hourly if r["metric"] == "commented") == 6
+
+def test_comment_batch_is_not_retried_row_by_row_after_a_failed_commit(session_factory, monkeypatch):
+    from sqlalchemy.orm import Session
+    from app.db.repositories import CommentRepo, CommitFailed, TicketRepo
+    repo = CommentRepo(session_factory)
+    comment_svc = CommentService(repo=repo, batch_size=2, batch_wait=0.05)
+    ticket = TicketService(repo=TicketRepo(session_factory), comment_service=comment_svc).create_ticket(
+        TicketCreate(title="A", description="a"))
+    retried = []
+    monkeypatch.setattr(repo, "save", lambda row: retried.append(row))
+    def lost_connection(self):
+        raise RuntimeError("connection lost during COMMIT")
+    monkeypatch.setattr(Session, "commit", lost_connection)
+
+    async def burst():
+        creates = [comment_svc.create_comment(CommentCreate(ticket_id=ticket["id"], user_email="u@example.com", content=f"c{i}"))
+                   for i in range(2)]
+        return await asyncio.gather(*creates, return_exceptions=True)
+
+    results = asyncio.run(burst())
+    assert all(isinstance(r, CommitFailed) for r in results)
+    assert retried == []
+
+def test_event_bus_delivery_drop_and_resume():
+    from app.services.event_bus import EventBus
+
+    async def scenario():
+        bus = EventBus(queue_size=2, buffer_size=3)
+        ticket_svc = TicketService(event_bus=bus)
+        sub = bus.subscribe()
+        saved = ticket_svc.create_ticket(TicketCreate(title="T", description="D"))
+        event = await sub.get()
+        assert event["type"] == "ticket.created" and event["data"]["id"] == saved["id"]
+
+        ticket_svc.update_ticket_status(saved["id"], "closed")
+        ticket_svc.update_ticket_priority(saved["id"], "high")
+        ticket_svc.update_ticket_title(saved["id"], "dropped here")
+        assert sub.dropped and bus.subscriber_count == 0
+
+        resumed = bus.subscribe(last_event_id=event["id"] + 1)
+        replayed = [(await resumed.get())["type"] for _ in range(2)]
+        assert replayed == ["ticket.updated", "ticket.updated"]
+
+        stale = bus.subscribe(last_event_id=0)
+        assert (await stale.get())["type"] == "reset"
+
+        # Still buffered, but more than the queue holds: reset instead of replay
+        behind = bus.subscribe(last_event_id=event["id"])
+        reset = await behind.get()
+        assert reset["type"] == "reset" and reset["id"] == event["id"] + 3
+        assert behind.queue.empty()
+
+    asyncio.run(scenario())
+
+def test_change_relay_publishes_other_workers_writes(session_factory):
+    from app.db.repositories import ChangeRepo, TicketRepo, changes_written_here
+    from app.services.event_bus import ChangeRelay, EventBus
+    tickets, changes = TicketRepo(session_factory), ChangeRepo(session_factory)
+    tickets.save({"title": "before", "description": "d"})
+    assert changes_written_here(changes.last_seq())
+
+    async def scenario():
+        bus = EventBus()
+        sub = bus.subscribe()
+        # Treat every entry as foreign, as another worker's relay would see it
+        relay = ChangeRelay(changes, bus, is_local=lambda seq: False, interval=0)
+        assert await relay.poll_once() == 0  # starts at the current end of the log
+        saved = await asyncio.to_thread(tickets.save, {"title": "elsewhere", "description": "d"})
+        assert await relay.poll_once() == 1
+        event = await sub.get()
+        assert event["type"] == "ticket.updated" and event["data"]["title"] == "elsewhere"
+        await asyncio.to_thread(tickets.delete, saved["id"])
+        assert await relay.poll_once() == 1
+        assert (await sub.get())["type"] == "ticket.deleted"
+        assert sub.queue.empty()
+
+        local = ChangeRelay(changes, bus, is_local=changes_written_here, interval=0)
+        await local.poll_once()
+        await asyncio.to_thread(tickets.save, {"title": "here", "description": "d"})
+        assert await local.poll_once() == 0
+
+    asyncio.run(scenario())
+
+def test_sync_changes_since_with_db_repos(session_factory):
+    from app.db.repositories import ChangeRepo, CommentRepo, TicketRepo
+    from app.services.sync_service import SyncService
+    comment_svc = CommentService(repo=CommentRepo(session_factory))
+    ticket_svc = TicketService(repo=TicketRepo(session_factory), comment_service=comment_svc)
+    sync_svc = SyncService(repo=ChangeRepo(session_factory))
+
+    keep = ticket_svc.create_ticket(TicketCreate(title="keep", description="k"))
+    gone = ticket_svc.create_ticket(TicketCreate(title="gone", description="g"))
+    checkpoint = sync_svc.changes_since(0, 100)["next_since"]
+
+    asyncio.run(comment_svc.create_comment(CommentCreate(ticket_id=keep["id"], user_email="u@example.com", content="c")))
+    ticket_svc.delete_ticket(gone["id"])
+
+    page = sync_svc.changes_since(checkpoint, 2)
+    assert page["has_more"] is True
+    assert [(c["entity"], c["op"]) for c in page["changes"]] == [("ticket", "upsert"), ("comment", "upsert")]
+    assert page["changes"][0]["data"]["comment_count"] == 1
+
+    rest = sync_svc.changes_since(page["next_since"], 2)
+    assert rest["has_more"] is False
+    assert rest["changes"] == [{"seq": rest["next_since"], "entity": "ticket", "id": gone["id"], "op": "delete", "data": None}]
+
+def test_change_log_seq_follows_commit_order(session_factory):
+    from app.db.repositories import ChangeRepo, _record_change
+    changes = ChangeRepo(session_factory)
+    first, second = session_factory(), session_factory()
+    try:
+        # `first` records its change before `second` but commits after it
+        _record_change(first, "ticket", 101)
+        _record_change(second, "ticket", 102)
+        second.commit()
+        seen = changes.changes_since(0, 100)
+        assert [c["id"] for c in seen["changes"]] == [102]
+        first.commit()
+    finally:
+        first.close()
+        second.close()
+    # A reader that checkpointed after `second` still gets `first`'s change
+    later = changes.changes_since(seen["next_since"], 100)["changes"]
+    assert [c["id"] for c in later] == [101]
+
+def test_sync_changes_since_in_memory():
+    from app.services.sync_service import InMemoryChangeLog, SyncService
+    from app.services.ticket_service import InMemoryRepo
+    log = InMemoryChangeLog()
+    comment_svc = CommentService(change_log=log)
+    ticket_svc = TicketService(repo=InMemoryRepo(change_log=log), comment_service=comment_svc)
+    sync_svc = SyncService(change_log=log)
+
+    saved = ticket_svc.create_ticket(TicketCreate(title="T", description="D"))
+    ticket_svc.update_ticket_status(saved["id"], "closed")
+    created = asyncio.run(comment_svc.create_comment(CommentCreate(ticket_id=saved["id"], user_email="u@example.com", content="c")))
+    comment_svc.delete_comment(created["id"])
+
+    changes = sync_svc.changes_since(0)["changes"]
+    assert [(c["entity"], c["op"]) for c in changes] == [("comment", "delete"), ("ticket", "upsert")]
+    assert changes[1]["data"]["comment_count"] == 0
+    assert sync_svc.changes_since(changes[-1]["seq"])["changes"] == []
+
+def _wait_for_job(job_svc, job_id, timeout=5.0):
+    import time
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = job_svc.get_job(job_id)
+        if job["status"] not in ("pending", "running"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_job_service_runs_bulk_update_and_recount(session_factory):
+    from app.db.repositories import CommentRepo, JobRepo, TicketRepo
+    from app.services.job_service import JobService
+    comment_svc = CommentService(repo=CommentRepo(session_factory))
+    ticket_svc = TicketService(repo=TicketRepo(session_factory), comment_service=comment_svc)
+    job_svc = JobService(repo=JobRepo(session_factory), ticket_service=ticket_svc)
+    ids = [ticket_svc.create_ticket(TicketCreate(title=f"T{i}", description="d"))["id"] for i in range(3)]
+    asyncio.run(comment_svc.create_comment(CommentCreate(ticket_id=ids[0], user_email="u@example.com", content="c")))
+    ticket_svc.repo.set_comment_stats(ids[0], 7)
+
+    job = job_svc.submit_job("bulk_update_tickets", {"ticket_ids": ids + [999], "status": "closed"})
+    done = _wait_for_job(job_svc, job["id"])
+    assert done["status"] == "succeeded" and done["progress"] == done["total"] == 4
+    assert done["result"] == {"updated": 3, "missing": [999]}
+    assert all(ticket_svc.get_ticket(tid)["status"] == "closed" for tid in ids)
+
+    done = _wait_for_job(job_svc, job_svc.submit_job("recount_comments")["id"])
+    assert done["result"] == {"recounted": 3}
+    assert ticket_svc.get_ticket(ids[0])["comment_count"] == 1
+    job_svc.shutdown()
+
+def test_job_service_cancel_and_queue_limit(monkeypatch):
+    import threading
+    from app.services import job_service
+    release = threading.Event()
+
+    def slow(ctx, tickets, params):
+        while not release.wait(0.01):
+            ctx.check_cancelled()
+        return {"ok": True}
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "slow", slow)
+
+    job_svc = job_service.JobService(ticket_service=TicketService(), max_workers=1, max_pending=1)
+    running = job_svc.submit_job("slow")
+    queued = job_svc.submit_job("slow")
+    try:
+        job_svc.submit_job("slow")
+        assert False, "expected JobQueueFull"
+    except job_service.JobQueueFull:
+        pass
+
+    assert job_svc.cancel_job(queued["id"])["status"] == "cancelled"
+    job_svc.cancel_job(running["id"])
+    assert _wait_for_job(job_svc, running["id"])["status"] == "cancelled"
+    job_svc.shutdown()
+
+def test_job_cancelled_from_another_worker_stops(session_factory, monkeypatch):
+    import time
+    from app.db.repositories import JobRepo
+    from app.services import job_service
+
+    def slow(ctx, tickets, params):
+        while True:
+            ctx.advance()
+            time.sleep(0.01)
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "slow", slow)
+
+    # Two processes sharing the database, each with its own job service
+    owner = job_service.JobService(repo=JobRepo(session_factory), ticket_service=TicketService())
+    other = job_service.JobService(repo=JobRepo(session_factory), ticket_service=TicketService())
+    job = owner.submit_job("slow")
+    deadline = time.monotonic() + 5
+    while owner.get_job(job["id"])["status"] != "running" and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert other.cancel_job(job["id"])["status"] == "cancelled"
+    deadline = time.monotonic() + 5
+    while owner._active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not owner._active
+    assert owner.get_job(job["id"])["status"] == "cancelled"
+    owner.shutdown()
+    other.shutdown()
+
+def test_starting_worker_fails_only_jobs_of_dead_workers(session_factory, monkeypatch):
+    import threading
+    import time
+    from app.db.repositories import JobRepo
+    from app.services import job_service
+    release = threading.Event()
+
+    def slow(ctx, tickets, params):
+        while not release.wait(0.01):
+            ctx.check_cancelled()
+        return {"ok": True}
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "slow", slow)
+
+    repo = JobRepo(session_factory)
+    live = job_service.JobService(repo=repo, ticket_service=TicketService(), lease=0.3)
+    running = live.submit_job("slow")
+    orphan = repo.save({"kind": "slow", "status": "running", "owner": "host:1:dead"})
+    # A worker starting (or restarting) while `live` keeps running its job
+    starting = job_service.JobService(repo=repo, ticket_service=TicketService(), lease=0.3)
+    try:
+        time.sleep(0.8)
+        assert repo.get(orphan["id"])["status"] == "failed"
+        assert repo.get(running["id"])["status"] == "running"
+        release.set()
+        assert _wait_for_job(live, running["id"])["status"] == "succeeded"
+    finally:
+        release.set()
+        live.shutdown()
+        starting.shutdown()
+
+def test_read_replica_routing_with_read_your_writes(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.db import engine as db
+    from app.db import models
+    from app.db.repositories import TicketRepo
+    factories = {}
+    for name in ("primary", "replica"):
+        eng = create_engine(f"sqlite:///{tmp_path / name}.db", future=True)
+        models.Base.metadata.create_all(bind=eng)
+        factories[name] = sessionmaker(bind=eng, expire_on_commit=False)
+    repo = TicketRepo(db.RoutingSessionFactory(factories["primary"], factories["replica"]))
+
+    token = db.set_client_key("writer")
+    try:
+        saved = repo.save({"title": "T", "description": "D"})
+        assert repo.get(saved["id"])["title"] == "T"  # pinned to primary after own write
+        monkeypatch.setattr(db, "READ_YOUR_WRITES_SECONDS", 0)
+        repo.save({"title": "T2", "description": "D2"})
+        assert repo.get(saved["id"]) is None  # window elapsed: replica has not caught up
+    finally:
+        db.reset_client_key(token)
+
+    token = db.set_client_key("someone-else")
+    try:
+        assert repo.list() == []
+    finally:
+        db.reset_client_key(token)
+
+def test_archive_closed_tickets_moves_them_out_of_hot_table(session_factory):
+    from app.db.repositories import CommentRepo, TicketRepo
+    comment_svc = CommentService(repo=CommentRepo(session_factory))
+    ticket_svc = TicketService(repo=TicketRepo(session_factory), comment_service=comment_svc)
+    old = ticket_svc.create_ticket(TicketCreate(title="old", description="d"))
+    recent = ticket_svc.create_ticket(TicketCreate(title="recent", description="d"))
+    hot = ticket_svc.create_ticket(TicketCreate(title="hot", description="d"))
+    asyncio.run(comment_svc.create_comment(CommentCreate(ticket_id=old["id"], user_email="u@example.com", content="history")))
+    ticket_svc.update_ticket_status(old["id"], "closed")
+    ticket_svc.update_ticket_status(recent["id"], "closed")
+
+    assert ticket_svc.archive_closed_tickets(older_than_days=1) == 0
+    batches = []
+    assert ticket_svc.archive_closed_tickets(older_than_days=-1, batch_size=1, on_batch=batches.append) == 2
+    assert batches == [1, 1]
+
+    assert [t["id"] for t in ticket_svc.list_tickets(include_comments=False)] == [hot["id"]]
+    archived = ticket_svc.get_ticket(old["id"])
+    assert archived["title"] == "old" and archived["status"] == "closed"
+    assert [c["content"] for c in archived["comments"]] == ["history"]
+    # A late comment on an archived ticket brings it and its comments back and counts
+    asyncio.run(comment_svc.create_comment(CommentCreate(ticket_id=old["id"], user_email="u@example.com", content="late")))
+    assert [c["content"] for c in ticket_svc.get_ticket(old["id"])["comments"]] == ["late", "history"]
+    assert ticket_svc.get_ticket(old["id"], include_comments=False)["comment_count"] == 2
+    assert {t["id"] for t in ticket_svc.list_tickets(include_comments=False)} == {old["id"], hot["id"]}
+    assert [c["content"] for c in ticket_svc.get_tickets([old["id"]], include_comments=True)["found"][old["id"]]["comments"]] == ["history", "late"]
+    assert [c["content"] for c in comment_svc.list_comments_for_ticket(old["id"])] == ["history", "late"]
+    assert ticket_svc.get_ticket(recent["id"], fields=("title",), include_comments=False) == {"id": recent["id"], "title": "recent"}
+    # Writes reach archived tickets too
+    assert ticket_svc.update_ticket_priority(recent["id"], "high")["priority"] == "high"
+    assert ticket_svc.archive_closed_tickets(older_than_days=-1) == 2
+    assert ticket_svc.delete_ticket(recent["id"])["id"] == recent["id"]
+    assert ticket_svc.get_ticket(recent["id"]) == {}
+
+    new = ticket_svc.create_ticket(TicketCreate(title="new", description="d"))
+    assert new["id"] not in (old["id"], recent["id"])
+
+def test_archive_closed_tickets_in_memory():
+    svc = TicketService()
+    closed = svc.create_ticket(TicketCreate(title="done", description="d", status="closed"))
+    reopened = svc.create_ticket(TicketCreate(title="again", description="d", status="closed"))
+    svc.update_ticket_status(reopened["id"], "open")
+
+    assert svc.archive_closed_tickets(older_than_days=-1) == 1
+    assert [t["id"] for t in svc.list_tickets()] == [reopened["id"]]
+    assert svc.get_ticket(closed["id"])["title"] == "done"
+
+    # Writes to an archived ticket move it back to the hot store
+    assert svc.repo.record_comment_activity(closed["id"], 1)["comment_count"] == 1
+    assert svc.update_ticket_status(closed["id"], "open")["status"] == "open"
+    assert [t["id"] for t in svc.list_tickets(sort="created")] == [closed["id"], reopened["id"]]
+
+def test_admission_controller_rate_limits_and_sheds():
+    from app.core.rate_limit import READ, STREAM, WRITE, AdmissionController
+    ctl = AdmissionController(max_in_flight=2, class_limits={READ: 2, WRITE: 1, STREAM: 1}, rate=1, burst=2)
+    assert ctl.admit("sub:a", READ) == (None, 0)
+    assert ctl.admit("sub:a", READ) == (None, 0)
+    assert ctl.admit("sub:a", READ) == (429, 1)  # bucket empty
+    assert ctl.admit("sub:b", WRITE) == (503, 1)  # global in-flight cap
+    assert ctl.admit("sub:b", STREAM) == (None, 0)  # streams only count against their class
+    ctl.release(READ)
+    assert ctl.admit("sub:c", WRITE) == (None, 0)
+    assert ctl.admit("sub:d", WRITE) == (503, 1)  # write class cap
+    # Shed requests give their token back, so retries are not rate limited
+    assert [ctl.admit("sub:d", WRITE) for _ in range(3)] == [(503, 1)] * 3
+    snap = ctl.snapshot()
+    assert (snap["admitted"], snap["rate_limited"], snap["shed"]) == (4, 1, 5)
+    assert snap["class_in_flight"] == {READ: 1, WRITE: 1, STREAM: 1}
+
+def test_in_memory_coalesced_reads_stay_on_the_event_loop(monkeypatch):
+    import threading
+    comment_svc = CommentService()
+    svc = TicketService(comment_service=comment_svc)
+    saved = svc.create_ticket(TicketCreate(title="T", description="D"))
+    threads = set()
+    original = comment_svc._snapshot
+    def record_thread():
+        threads.add(threading.get_ident())
+        return original()
+    monkeypatch.setattr(comment_svc, "_snapshot", record_thread)
+
+    async def reads():
+        ticket = await svc.get_ticket_coalesced(saved["id"])
+        listed = await svc.list_tickets_coalesced()
+        return ticket, listed
+
+    ticket, listed = asyncio.run(reads())
+    assert ticket["id"] == saved["id"] and [t["id"] for t in listed] == [saved["id"]]
+    # Reads of the in-memory stores are not handed to worker threads
+    assert threads == {threading.get_ident()}
+
+def test_concurrent_identical_reads_share_one_backend_call():
+    import time
+    from app.services.event_bus import EventBus
+    from app.services.ticket_service import InMemoryRepo
+
+    class SlowRepo(InMemoryRepo):
+        calls = 0
+        fail = False
+        def get(self, tid, fields=None):
+            SlowRepo.calls += 1
+            time.sleep(0.05)
+            if SlowRepo.fail:
+                raise RuntimeError("db down")
+            return super().get(tid, fields)
+
+    svc = TicketService(repo=SlowRepo(), event_bus=EventBus())
+    tid = svc.create_ticket(TicketCreate(title="hot", description="d"))["id"]
+
+    async def burst(n):
+        return await asyncio.gather(*[svc.get_ticket_coalesced(tid, include_comments=False) for _ in range(n)], return_exceptions=True)
+
+    results = asyncio.run(burst(50))
+    assert SlowRepo.calls == 1 and all(r["title"] == "hot" for r in results)
+
+    SlowRepo.fail = True
+    results = asyncio.run(burst(10))
+    assert SlowRepo.calls == 2 and all(isinstance(r, RuntimeError) for r in results)
+    SlowRepo.fail = False
+
+    async def read_across_write():
+        before = asyncio.ensure_future(svc.get_ticket_coalesced(tid, include_comments=False))
+        await asyncio.sleep(0.01)
+        svc.update_ticket_title(tid, "renamed")
+        after = await svc.get_ticket_coalesced(tid, include_comments=False)
+        await before
+        return after
+
+    assert asyncio.run(read_across_write())["title"] == "renamed"
+    assert SlowRepo.calls == 4
+
+def test_batch_get_tickets_uses_one_query_per_table(session_factory):
+    from sqlalchemy import event
+    from app.db.repositories import CommentRepo, TicketRepo
+    comment_svc = CommentService(repo=CommentRepo(session_factory))
+    ticket_svc = TicketService(repo=TicketRepo(session_factory), comment_service=comment_svc)
+    ids = [ticket_svc.create_ticket(TicketCreate(title=f"T{i}", description="d"))["id"] for i in range(3)]
+    for tid in ids:
+        asyncio.run(comment_svc.create_comment(CommentCreate(ticket_id=tid, user_email="u@example.com", content=f"c{tid}")))
+
+    statements = []
+    engine = session_factory.kw["bind"]
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        result = ticket_svc.get_tickets(ids + [999], fields=("title",), include_comments=True)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert result["missing"] == [999]
+    assert result["found"][ids[1]]["title"] == "T1"
+    assert [c["content"] for c in result["found"][ids[1]]["comments"]] == [f"c{ids[1]}"]
+    # hot tickets, archived tickets (for the miss), hot and archived comments
+    assert len(statements) == 4
+
+def test_user_cache_serves_hits_and_misses_until_invalidated(session_factory, monkeypatch):
+    from sqlalchemy import text
+    from app.core.config import settings
+    from app.db.repositories import UserRepo
+    monkeypatch.setattr(settings, "USER_CACHE_VERSION_CHECK_MS", 0)
+
+    class CountingRepo(UserRepo):
+        lookups = 0
+        def get_by_email(self, email):
+            CountingRepo.lookups += 1
+            return super().get_by_email(email)
+
+    user_svc = UserService(repo=CountingRepo(session_factory))
+    assert asyncio.run(user_svc.get_user("new@example.com")) is None
+    assert asyncio.run(user_svc.get_user("NEW@example.com")) is None
+    assert CountingRepo.lookups == 1  # negative entry, shared across casing
+
+    user_svc.create_user(UserCreate(email="new@example.com", role="user"))
+    assert asyncio.run(user_svc.get_user("new@example.com"))["role"] == "user"
+    asyncio.run(user_svc.get_user("new@example.com"))
+    assert CountingRepo.lookups == 2
+
+    asyncio.run(user_svc.update_user_role("new@example.com", "admin"))
+    assert asyncio.run(user_svc.get_user("new@example.com"))["role"] == "admin"
+    asyncio.run(user_svc.delete_user("new@example.com"))
+    assert asyncio.run(user_svc.get_user("new@example.com")) is None
+    assert CountingRepo.lookups == 4
+
+    with session_factory.kw["bind"].connect() as conn:
+        plan = conn.execute(text("EXPLAIN QUERY PLAN SELECT id FROM users WHERE lower(email) = 'x'")).fetchall()
+    assert any("ix_users_email_lower" in str(row) for row in plan)
+
+def test_user_cache_sees_writes_from_other_processes(session_factory, monkeypatch):
+    from app.core.config import settings
+    from app.db.repositories import UserRepo
+    monkeypatch.setattr(settings, "USER_CACHE_VERSION_CHECK_MS", 0)
+    # Two services with their own caches over one database, as in two workers
+    worker_a = UserService(repo=UserRepo(session_factory))
+    worker_b = UserService(repo=UserRepo(session_factory))
+    worker_a.create_user(UserCreate(email="shared@example.com", role="user"))
+    assert asyncio.run(worker_b.get_user("shared@example.com"))["role"] == "user"
+    assert asyncio.run(worker_b.get_users(["gone@example.com"]))["missing"] == ["gone@example.com"]
+
+    asyncio.run(worker_a.update_user_role("shared@example.com", "admin"))
+    worker_a.create_user(UserCreate(email="gone@example.com", role="user"))
+    assert asyncio.run(worker_b.get_user("shared@example.com"))["role"] == "admin"
+    assert asyncio.run(worker_b.get_users(["gone@example.com"]))["missing"] == []
+
+def test_batch_user_lookup_finds_mixed_case_stored_emails(session_factory):
+    from app.db.repositories import UserRepo
+    repo = UserRepo(session_factory)
+    repo.save({"email": "Legacy@Example.com", "role": "user"})  # stored before emails were normalized
+    user_svc = UserService(repo=repo)
+    result = asyncio.run(user_svc.get_users(["legacy@example.com", "LEGACY@example.com"]))
+    assert result["missing"] == [] and set(result["found"]) == {"legacy@example.com", "LEGACY@example.com"}
+    # Not cached as missing either
+    assert asyncio.run(user_svc.get_users(["legacy@example.com"]))["missing"] == []
+
+@pytest.mark.parametrize("use_db", [False, True])
+def test_comment_keyset_pages_cover_all_comments_newest_first(use_db, request, monkeypatch):
+    from app.core.config import settings
+    if use_db:
+        from app.db.repositories import CommentRepo, TicketRepo
+        session_factory = request.getfixturevalue("session_factory")
+        comment_svc = CommentService(repo=CommentRepo(session_factory))
+        ticket_svc = TicketService(repo=TicketRepo(session_factory), comment_service=comment_svc)
+    else:
+        comment_svc = CommentService()
+        ticket_svc = TicketService(comment_service=comment_svc)
+    monkeypatch.setattr(settings, "TICKET_EMBEDDED_COMMENTS", 2)
+    tid = ticket_svc.create_ticket(TicketCreate(title="incident", description="d"))["id"]
+    for i in range(5):
+        asyncio.run(comment_svc.create_comment(CommentCreate(ticket_id=tid, user_email="u@example.com", content=f"c{i}")))
+
+    detail = ticket_svc.get_ticket(tid)
+    assert [c["content"] for c in detail["comments"]] == ["c4", "c3"]
+    seen, cursor = [], detail["comments_next_cursor"]
+    while cursor:
+        page = ticket_svc.list_ticket_comments(tid, limit=2, cursor=cursor)
+        seen += [c["content"] for c in page["comments"]]
+        cursor = page["next_cursor"]
+    assert seen == ["c2", "c1", "c0"]
+
+    assert ticket_svc.list_ticket_comments(tid, limit=10)["next_cursor"] is None
+    assert ticket_svc.list_ticket_comments(999) is None
+    with pytest.raises(ValueError):
+        ticket_svc.list_ticket_comments(tid, cursor="not-a-cursor")
+
+@pytest.mark.parametrize("use_db", [False, True])
+def test_claim_next_hands_out_highest_priority_oldest_first(use_db, request):
+    if use_db:
+        from app.db.repositories import TicketRepo
+        ticket_svc = TicketService(repo=TicketRepo(request.getfixturevalue("session_factory")))
+    else:
+        ticket_svc = TicketService()
+    low = ticket_svc.create_ticket(TicketCreate(title="low", description="d", priority="low"))
+    first_high = ticket_svc.create_ticket(TicketCreate(title="high 1", description="d", priority="high"))
+    promoted = ticket_svc.create_ticket(TicketCreate(title="promoted", description="d", priority="low"))
+    ticket_svc.create_ticket(TicketCreate(title="done", description="d", priority="high", status="closed"))
+    second_high = ticket_svc.create_ticket(TicketCreate(title="high 2", description="d", priority="high"))
+    ticket_svc.update_ticket_priority(promoted["id"], "medium")
+
+    claimed = [ticket_svc.claim_next_ticket(f"agent{i}@example.com") for i in range(5)]
+    assert [t and t["id"] for t in claimed] == [first_high["id"], second_high["id"], promoted["id"], low["id"], None]
+    assert claimed[0]["status"] == "in_progress" and claimed[0]["assignee"] == "agent0@example.com"
+
+    ticket_svc.update_ticket_status(low["id"], "open")
+    assert ticket_svc.claim_next_ticket("agent9@example.com")["id"] == low["id"]
+
+def test_concurrent_claims_never_hand_out_a_ticket_twice():
+    from concurrent.futures import ThreadPoolExecutor
+    ticket_svc = TicketService()
+    ids = {ticket_svc.create_ticket(TicketCreate(title=f"t{i}", description="d"))["id"] for i in range(200)}
+
+    def drain(agent):
+        taken = []
+        while (ticket := ticket_svc.claim_next_ticket(agent)) is not None:
+            taken.append(ticket["id"])
+        return taken
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(drain, [f"agent{i}" for i in range(8)]))
+    claimed = [tid for taken in results for tid in taken]
+    assert sorted(claimed) == sorted(ids)
+
+@pytest.mark.parametrize("use_db", [False, True])
+def test_activity_report_reads_counts_bumped_on_writes(use_db, request):
+    from app.services.report_service import InMemoryActivityRollup, ReportService
+    if use_db:
+        from app.db.repositories import ActivityRepo, CommentRepo, TicketRepo
+        session_factory = request.getfixturevalue("session_factory")
+        comment_svc = CommentService(repo=CommentRepo(session_factory))
+        ticket_svc = TicketService(repo=TicketRepo(session_factory), comment_service=comment_svc)
+        report_svc = ReportService(repo=ActivityRepo(session_factory))
+    else:
+        rollup = InMemoryActivityRollup()
+        comment_svc = CommentService(rollup=rollup)
+        from app.services.ticket_service import InMemoryRepo
+        ticket_svc = TicketService(repo=InMemoryRepo(rollup=rollup), comment_service=comment_svc)
+        report_svc = ReportService(rollup=rollup)
+    first = ticket_svc.create_ticket(TicketCreate(title="a", description="d"))
+    ticket_svc.create_ticket(TicketCreate(title="b", description="d"))
+    asyncio.run(comment_svc.create_comment(CommentCreate(ticket_id=first["id"], user_email="u@example.com", content="c")))
+    ticket_svc.update_ticket_status(first["id"], "closed")
+    ticket_svc.update_ticket_status(first["id"], "closed")
+
+    day = report_svc.activity("day", days=1)
+    assert day["granularity"] == "day"
+    assert [{k: b[k] for k in ("created", "closed", "commented")} for b in day["buckets"]] == [{"created": 2, "closed": 1, "commented": 1}]
+    assert sum(b["created"] for b in report_svc.activity("hour", days=1)["buckets"]) == 2
+
+    if use_db:
+        assert report_svc.rebuild_rollup(days=1) >= 3
+        assert report_svc.activity("day", days=1)["buckets"] == day["buckets"]
+
+def test_slow_query_log_names_repo_method_and_explains_once(session_factory, caplog):
+    import json
+    from app.db import engine as db
+    from app.db.repositories import TicketRepo
+    db.install_query_logging(session_factory.kw["bind"], threshold_ms=0)
+    repo = TicketRepo(session_factory)
+    tid = repo.save({"title": "t", "description": "d"})["id"]
+    caplog.clear()
+
+    token = db.set_request_id("req-1")
+    try:
+        with caplog.at_level("WARNING", logger="app.db.slow_query"):
+            repo.get(tid, fields=("title",))
+            repo.get(tid, fields=("title",))
+    finally:
+        db.reset_request_id(token)
+
+    entries = [json.loads(r.message) for r in caplog.records if r.name == "app.db.slow_query"]
+    assert len(entries) == 2
+    assert entries[0]["repo_method"] == "TicketRepo.get" and entries[0]["request_id"] == "req-1"
+    assert entries[0]["sql"].endswith("FROM tickets WHERE tickets.id = ? LIMIT ? OFFSET ?")
+    assert list(entries[0]["params"]) and all(t == "int" for t in entries[0]["params"])
+    assert any("tickets" in line for line in entries[0]["explain"])
+    assert "explain" not in entries[1]
+
+    from sqlalchemy import text
+    caplog.clear()
+    with caplog.at_level("WARNING", logger="app.db.slow_query"):
+        with session_factory.kw["bind"].begin() as conn:
+            conn.execute(text("CREATE TABLE scratch (x INTEGER)"))
+            conn.execute(text("DROP TABLE scratch"))
+    entries = [json.loads(r.message) for r in caplog.records if r.name == "app.db.slow_query"]
+    assert entries and all("explain" not in e for e in entries)  # DDL is never explained
+
+def test_slow_query_explain_keeps_the_callers_transaction_on_shared_connection_pools(caplog):
+    import json
+    from sqlalchemy import create_engine, text
+    from app.db import engine as db
+    bind = create_engine("sqlite://", future=True)  # SingletonThreadPool: one connection per thread
+    db.install_query_logging(bind, threshold_ms=0)
+    try:
+        with bind.connect() as conn:
+            conn.execute(text("CREATE TABLE t (x INTEGER)"))
+            conn.commit()
+            with caplog.at_level("WARNING", logger="app.db.slow_query"):
+                conn.execute(text("INSERT INTO t VALUES (1)"))
+                conn.execute(text("SELECT x FROM t WHERE x = 1"))
+            conn.commit()
+            assert conn.execute(text("SELECT count(*) FROM t")).scalar() == 1
+        entries = [json.loads(r.message) for r in caplog.records if r.name == "app.db.slow_query"]
+        assert entries and all("explain" not in e for e in entries)
+    finally:
+        bind.dispose()
+
+def test_journal_restores_in_memory_stores_from_snapshot_and_log(tmp_path):
+    from app.core.journal import Journal
+    from app.services.report_service import InMemoryActivityRollup, ReportService
+    from app.services.sync_service import InMemoryChangeLog
+    from app.services.ticket_service import InMemoryRepo
+
+    def open_services():
+        journal = Journal(str(tmp_path), fsync_interval=0.01, snapshot_every=0)
+        changes, rollup = InMemoryChangeLog(), InMemoryActivityRollup()
+        changes.attach(journal)
+        rollup.attach(journal)
+        users = UserService(journal=journal)
+        comments = CommentService(journal=journal, change_log=changes, rollup=rollup)
+        tickets = TicketService(repo=InMemoryRepo(journal=journal, change_log=changes, rollup=rollup), comment_service=comments)
+        journal.load()
+        return journal, users, comments, tickets, changes, ReportService(rollup=rollup)
+
+    journal, users, comments, tickets, changes, reports = open_services()
+    users.create_user(UserCreate(email="Ann@example.com", role="user"))
+    users.create_user(UserCreate(email="gone@example.com", role="user"))
+    first = tickets.create_ticket(TicketCreate(title="first", description="d", priority="high"))
+    closed = tickets.create_ticket(TicketCreate(title="closed", description="d"))
+    asyncio.run(comments.create_comment(CommentCreate(ticket_id=first["id"], user_email="ann@example.com", content="hi")))
+    journal.snapshot()
+    tickets.update_ticket_status(closed["id"], "closed")
+    tickets.archive_closed_tickets(older_than_days=-1)
+    tickets.update_ticket_title(first["id"], "renamed")
+    asyncio.run(users.delete_user("gone@example.com"))
+    before = changes.changes_since(0, 100)
+    activity = reports.activity("hour", days=1)
+    assert {k: sum(b[k] for b in activity["buckets"]) for k in ("created", "closed", "commented")} == {"created": 2, "closed": 1, "commented": 1}
+    journal.close()
+    with open(tmp_path / f"wal.{journal._gen}.log", "a") as f:
+        f.write('{"s": "tickets", "op": "put", "k": 9')  # torn write from a crash
+
+    journal, users, comments, tickets, changes, reports = open_services()
+    try:
+        assert changes.changes_since(0, 100) == before
+        assert reports.activity("hour", days=1) == activity
+        assert changes.record("ticket", first["id"], {}) == before["next_since"] + 1
+        assert tickets.get_ticket(first["id"], include_comments=False)["title"] == "renamed"
+        assert tickets.get_ticket(closed["id"], include_comments=False)["status"] == "closed"
+        assert [t["id"] for t in tickets.list_tickets(include_comments=False)] == [first["id"]]
+        assert [c["content"] for c in comments.list_comments_for_ticket(first["id"])] == ["hi"]
+        assert [u["email"] for u in asyncio.run(users.list_users())] == ["ann@example.com"]
+        assert tickets.create_ticket(TicketCreate(title="next", description="d"))["id"] == closed["id"] + 1
+        assert tickets.claim_next_ticket("agent")["id"] == first["id"]
+    finally:
+        journal.close()
+
+def test_journal_refuses_writes_after_a_failed_flush(tmp_path, monkeypatch, caplog):
+    from app.core import journal as journal_mod
+
+    journal = journal_mod.Journal(str(tmp_path), fsync_interval=0.01, snapshot_every=0)
+    journal.attach("users", {})
+    journal.load()
+    def disk_full(fd):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(journal_mod.os, "fsync", disk_full)
+    with caplog.at_level("ERROR", logger="app.core.journal"):
+        journal.put("users", "a@example.com", {"email": "a@example.com"})
+        journal._flusher.join(timeout=5)
+    assert not journal._flusher.is_alive()
+    assert any("failed" in r.message for r in caplog.records)
+    with pytest.raises(journal_mod.JournalError):
+        journal.put("users", "b@example.com", {"email": "b@example.com"})
+    with pytest.raises(journal_mod.JournalError):
+        journal.snapshot()
+    journal.close()